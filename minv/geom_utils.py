@@ -34,6 +34,11 @@ from math import ceil, floor
 from itertools import izip, chain
 from collections import defaultdict
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class GeometryError(ValueError):
     """ Base geometry error exception """
@@ -435,6 +440,217 @@ def fix_footprint(footprint, scene_centre=None, wrap_geometry=True):
     return footprint, scene_centre
 
 
+def fix_footprints(footprints, wrap_geometry=True, return_errors=False,
+                   atol=1e-12):
+    """ Batch version of `fix_footprint` processing a whole block of
+    footprint strings at once.
+    The footprints are parsed into contiguous coordinate arrays and the
+    dateline detection, unwrapping, centroid and extent evaluation are
+    performed with NumPy for all rings of the block of the same length at
+    once. The result is the same list of (footprint, scene centre) pairs as
+    produced by `fix_footprint` for each of the footprints.
+    Footprints which require special treatment (touching the poles, having
+    degenerated rings or exceeding the dateline bounds) as well as all
+    footprints in case of NumPy not being available are passed to the scalar
+    implementation.
+    If `return_errors` is set, the exceptions raised for the individual
+    footprints are returned in place of the results instead of being raised.
+    """
+    footprints = list(footprints)
+    results = [None] * len(footprints)
+    scalar = set(xrange(len(footprints)))
+    if numpy is not None:
+        scalar = _fix_footprints_block(
+            footprints, results, wrap_geometry, atol
+        )
+
+    for idx in sorted(scalar):
+        try:
+            results[idx] = fix_footprint(
+                footprints[idx], wrap_geometry=wrap_geometry
+            )
+        except Exception as exc:
+            if not return_errors:
+                raise
+            results[idx] = exc
+    return results
+
+
+def _fix_footprints_block(footprints, results, wrap_geometry, atol):
+    """ Vectorized part of the `fix_footprints`. The results are stored in the
+    passed list and the set of indices of the footprints left for the scalar
+    implementation is returned.
+    """
+    # pylint: disable=R0912,R0914,R0915
+    scalar = set()
+
+    # parse the footprints to a flat list of tokens
+    tokens, ring_fp, ring_start, ring_size = [], [], [], []
+    for idx, footprint in enumerate(footprints):
+        if not isinstance(footprint, basestring):
+            scalar.add(idx)
+            continue
+        rings = []
+        for item in footprint.split("|"):
+            values = item.split()
+            size = len(values) // 2
+            if size:
+                rings.append((values, size))
+        if not rings or min(size for _, size in rings) < 3:
+            scalar.add(idx)
+            continue
+        for values, size in rings:
+            ring_fp.append(idx)
+            ring_start.append(len(tokens) // 2)
+            ring_size.append(size)
+            tokens.extend(values[:2 * size])
+
+    if not ring_fp:
+        return scalar | set(xrange(len(footprints)))
+
+    try:
+        coords = numpy.array(tokens, dtype='float64')
+    except ValueError:
+        # let the scalar implementation report the invalid values
+        return set(xrange(len(footprints)))
+    del tokens
+    lat, lon = coords[0::2], coords[1::2]
+
+    ring_fp = numpy.array(ring_fp)
+    ring_start = numpy.array(ring_start)
+    ring_last = ring_start + numpy.array(ring_size) - 1
+    # closed loop (same as `iter_closed_loop`)
+    is_closed = (
+        (lat[ring_start] == lat[ring_last]) &
+        (lon[ring_start] == lon[ring_last])
+    )
+    ring_length = ring_last - ring_start + 1 + ~is_closed
+    n_rings = len(ring_fp)
+
+    ring_ok = numpy.ones(n_rings, dtype='bool')
+    ring_sum = numpy.zeros(n_rings)
+    ring_sumx = numpy.zeros(n_rings)
+    ring_sumy = numpy.zeros(n_rings)
+    ring_xmin = numpy.zeros(n_rings)
+    ring_xmax = numpy.zeros(n_rings)
+    groups = []
+
+    # process the rings of the same length as 2D arrays
+    for length in numpy.unique(ring_length):
+        sel = numpy.nonzero(ring_length == length)[0]
+        index = ring_start[sel, numpy.newaxis] + numpy.arange(length)
+        index[:, -1] = numpy.where(
+            is_closed[sel], index[:, -1], ring_start[sel]
+        )
+        y, x = lat[index], lon[index]
+
+        # rings touching the poles or having non-finite coordinates are
+        # left for the scalar implementation
+        ring_ok[sel] &= ~(90.0 - numpy.abs(y) <= atol).any(axis=1)
+        ring_ok[sel] &= numpy.isfinite(x).all(axis=1)
+
+        # dateline unwrapping (same as `_polygon_unwrap_dateline`)
+        dx0 = x[:, 1:] - x[:, :-1]
+        tmp = (dx0 - -180.0) / 360.0
+        dx1 = (tmp - numpy.floor(tmp)) * 360.0 + -180.0
+        tmp = dx1 - dx0
+        # NOTE: rounding half away from zero as the Python 2 `round`
+        tmp = numpy.copysign(numpy.floor(numpy.abs(tmp) + 0.5), tmp)
+        tmp[~(numpy.abs(dx0) - numpy.abs(dx1) > atol)] = 0.0
+        period = numpy.cumsum(tmp, axis=1)
+        x[:, 1:] += period
+        # polygons containing the poles
+        ring_ok[sel] &= period[:, -1] == 0
+
+        # centroid contributions (same as `_centroid`)
+        tmp = y[:, 1:] * x[:, :-1] - y[:, :-1] * x[:, 1:]
+        sum_ = numpy.cumsum(tmp, axis=1)[:, -1]
+        ring_sumx[sel] = numpy.cumsum(
+            tmp * (y[:, :-1] + y[:, 1:]), axis=1
+        )[:, -1]
+        ring_sumy[sel] = numpy.cumsum(
+            tmp * (x[:, :-1] + x[:, 1:]), axis=1
+        )[:, -1]
+        # zero area rings are left for the scalar implementation
+        ring_ok[sel] &= sum_ != 0.0
+        ring_sum[sel] = sum_ * 3.0
+
+        ring_xmin[sel] = x.min(axis=1)
+        ring_xmax[sel] = x.max(axis=1)
+        groups.append((sel, y, x))
+
+    fp_ok = numpy.zeros(len(footprints), dtype='bool')
+    fp_ok[ring_fp] = True
+    fp_ok[ring_fp[~ring_ok]] = False
+
+    # multi-polygon centroid (same as `multi_polygon_centroid`), the rings
+    # of the footprints are accumulated in the order of their appearance
+    fp_sum = numpy.zeros(len(footprints))
+    fp_sumx = numpy.zeros(len(footprints))
+    fp_sumy = numpy.zeros(len(footprints))
+    fp_xmin = numpy.zeros(len(footprints))
+    fp_xmax = numpy.zeros(len(footprints))
+    new_fp = numpy.ones(n_rings, dtype='bool')
+    new_fp[1:] = ring_fp[1:] != ring_fp[:-1]
+    fp_first = numpy.nonzero(new_fp)[0]
+    ring_order = numpy.arange(n_rings) - numpy.repeat(
+        fp_first, numpy.diff(numpy.append(fp_first, n_rings))
+    )
+    sgn = numpy.where(ring_sum >= 0.0, +1.0, -1.0)
+    for order in xrange(ring_order.max() + 1):
+        sel = numpy.nonzero(ring_order == order)[0]
+        fps = ring_fp[sel]
+        fp_sum[fps] += sgn[sel] * ring_sum[sel]
+        fp_sumx[fps] += sgn[sel] * ring_sumx[sel]
+        fp_sumy[fps] += sgn[sel] * ring_sumy[sel]
+        if order == 0:
+            fp_xmin[fps] = ring_xmin[sel]
+            fp_xmax[fps] = ring_xmax[sel]
+        else:
+            fp_xmin[fps] = numpy.minimum(fp_xmin[fps], ring_xmin[sel])
+            fp_xmax[fps] = numpy.maximum(fp_xmax[fps], ring_xmax[sel])
+    fp_ok &= fp_sum != 0.0
+    fp_sum[~fp_ok] = 1.0
+
+    y_cnt = fp_sumx / fp_sum
+    tmp = (fp_sumy / fp_sum - -180.0) / 360.0
+    x_cnt = (tmp - numpy.floor(tmp)) * 360.0 + -180.0
+
+    # translation of the footprints not containing the scene centre
+    fp_offset = numpy.zeros(len(footprints))
+    fp_offset[fp_xmin > x_cnt] = -360.0
+    fp_offset[(fp_xmin <= x_cnt) & (fp_xmax < x_cnt)] = +360.0
+
+    rings = [None] * n_rings
+    for sel, y, x in groups:
+        offset = fp_offset[ring_fp[sel]]
+        shifted = offset != 0.0
+        x[shifted] += offset[shifted, numpy.newaxis]
+        y[shifted] += 0.0
+        inside = ((x >= -180.0) & (x <= 180.0)).all(axis=1)
+        for ring_idx, ring_y, ring_x, ring_inside in izip(
+                sel, y.tolist(), x.tolist(), inside.tolist()):
+            if fp_ok[ring_fp[ring_idx]]:
+                rings[ring_idx] = (zip(ring_y, ring_x), ring_inside)
+
+    # compose the results
+    for idx, ring_idx in izip(ring_fp.tolist(), xrange(n_rings)):
+        if not fp_ok[idx]:
+            continue
+        if results[idx] is None:
+            results[idx] = ([], (float(y_cnt[idx]), float(x_cnt[idx])))
+        ring, ring_inside = rings[ring_idx]
+        if not wrap_geometry:
+            results[idx][0].append(ring)
+        elif not ring_inside:
+            results[idx][0].extend(polygon_wrap_dateline(ring))
+        elif len(ring) > 3:
+            results[idx][0].append(ring)
+
+    scalar.update(numpy.nonzero(~fp_ok)[0].tolist())
+    return scalar
+
+
 def coords2bbox(coords):
     """ Calculate a bounding box from a set of coordinates """
     tmp = zip(*coords)
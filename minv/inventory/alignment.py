@@ -0,0 +1,191 @@
+# ------------------------------------------------------------------------------
+#
+# Project: Master Inventory <http://github.com/ESA-MInv/minv>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+# ------------------------------------------------------------------------------
+# Copyright (C) 2016 European Space Agency
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+import logging
+
+from django.db import connection, transaction
+
+from minv.inventory import models
+from minv.utils import Timer
+
+
+logger = logging.getLogger(__name__)
+
+# number of filenames to update the alignment index for in one statement
+BATCH_SIZE = 5000
+
+# name of the temporary table to stash the filenames of deleted records in
+STASH_TABLE = "minv_alignment_stash"
+
+
+def _delete(cursor, collection, restriction=None, params=None):
+    """ Helper to delete the alignment index entries of the collection,
+    optionally restricted by the given SQL condition on the ``filename``.
+    Uses plain SQL, as the entries do not need to be fetched for that.
+    """
+    query = "DELETE FROM %s WHERE collection_id = %%s" % (
+        models.AlignmentEntry._meta.db_table
+    )
+    if restriction:
+        query += " AND filename %s" % restriction
+    cursor.execute(query, [collection.pk] + list(params or []))
+
+
+def _populate(cursor, collection, location_ids, restriction=None,
+              params=None):
+    """ Helper to (re-)insert the alignment index entries of the collection
+    from its records, optionally restricted by the given SQL condition on
+    the ``filename``. Like in :func:`minv.inventory.queries.search`, the
+    records of incompletely ingested index files are left out.
+    """
+    query = """
+        INSERT INTO %(entry_table)s
+            (collection_id, filename, location_ids, checksums, misaligned)
+        SELECT
+            %%s, record.filename,
+            string_agg(
+                record.location_id::text, ',' ORDER BY record.location_id
+            ),
+            string_agg(
+                COALESCE(record.checksum, ''), ',' ORDER BY record.location_id
+            ),
+            COUNT(*) < %%s OR COUNT(DISTINCT record.checksum) > 1
+        FROM %(record_table)s AS record
+        JOIN %(index_file_table)s AS index_file
+            ON index_file.id = record.index_file_id AND index_file.complete
+        WHERE record.location_id = ANY(%%s) %(restriction)s
+        GROUP BY record.filename
+    """ % {
+        "entry_table": models.AlignmentEntry._meta.db_table,
+        "record_table": models.Record._meta.db_table,
+        "index_file_table": models.IndexFile._meta.db_table,
+        "restriction": (
+            "AND record.filename %s" % restriction if restriction else ""
+        )
+    }
+    cursor.execute(
+        query, [collection.pk, len(location_ids), location_ids] +
+        list(params or [])
+    )
+
+
+def _is_indexed(collection):
+    return models.Collection.objects.filter(
+        pk=collection.pk, alignment_indexed=True
+    ).exists()
+
+
+def _update(collection, restriction, params=None):
+    location_ids = list(collection.locations.values_list("pk", flat=True))
+    cursor = connection.cursor()
+    _delete(cursor, collection, restriction, params)
+    _populate(cursor, collection, location_ids, restriction, params)
+
+
+@transaction.atomic
+def rebuild_alignment_index(collection):
+    """ Rebuilds the alignment index of the collection from all its records
+    and marks it as usable.
+    """
+    timer = Timer()
+    location_ids = list(collection.locations.values_list("pk", flat=True))
+
+    cursor = connection.cursor()
+    _delete(cursor, collection)
+    _populate(cursor, collection, location_ids)
+
+    models.Collection.objects.filter(pk=collection.pk).update(
+        alignment_indexed=True
+    )
+    collection.alignment_indexed = True
+    logger.info(
+        "Rebuilt the alignment index of %s in %.3fs"
+        % (collection, timer.stop())
+    )
+
+
+@transaction.atomic
+def update_alignment_index(collection, filenames):
+    """ Updates the alignment index entries of the given filenames. Does
+    nothing when the alignment index is not usable anyways and has to be
+    rebuilt.
+    """
+    if not _is_indexed(collection):
+        return
+
+    filenames = list(filenames)
+    for i in range(0, len(filenames), BATCH_SIZE):
+        _update(collection, "= ANY(%s)", [filenames[i:i + BATCH_SIZE]])
+
+
+@transaction.atomic
+def update_index_file_alignment(index_file):
+    """ Updates the alignment index entries of the filenames of the records
+    of the given :class:`IndexFile`, e.g. after they were ingested. The
+    filenames are selected in SQL, so they are never loaded. Does nothing
+    when the alignment index is not usable anyways.
+    """
+    collection = index_file.location.collection
+    if not _is_indexed(collection):
+        return
+
+    _update(
+        collection,
+        "IN (SELECT filename FROM %s WHERE index_file_id = %%s)"
+        % models.Record._meta.db_table, [index_file.pk]
+    )
+
+
+def stash_alignment_filenames(collection, records):
+    """ Copies the filenames of the given :class:`QuerySet` of records to a
+    temporary table before they are deleted, so that their alignment index
+    entries can be updated by :func:`update_stashed_alignment` afterwards.
+    The filenames are only stashed when the alignment index is usable. Both
+    functions have to be called in the same transaction.
+    """
+    cursor = connection.cursor()
+    cursor.execute(
+        "CREATE TEMPORARY TABLE IF NOT EXISTS %s (filename text) "
+        "ON COMMIT DROP" % STASH_TABLE
+    )
+    if not _is_indexed(collection):
+        return
+
+    query, params = records.values("filename").query.sql_with_params()
+    cursor.execute(
+        "INSERT INTO %s (filename) %s" % (STASH_TABLE, query), params
+    )
+
+
+def update_stashed_alignment(collection):
+    """ Updates the alignment index entries of the filenames stashed by
+    :func:`stash_alignment_filenames` and drops the temporary table.
+    """
+    if _is_indexed(collection):
+        _update(collection, "IN (SELECT filename FROM %s)" % STASH_TABLE)
+    connection.cursor().execute("DROP TABLE %s" % STASH_TABLE)
@@ -0,0 +1,150 @@
+# ------------------------------------------------------------------------------
+#
+# Project: Master Inventory <http://github.com/ESA-MInv/minv>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+# ------------------------------------------------------------------------------
+# Copyright (C) 2016 European Space Agency
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+from itertools import islice
+
+from django.db import connection
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.utils.timezone import now
+
+from minv.inventory import models
+
+
+# number of annotations to insert by filename in one statement
+BATCH_SIZE = 5000
+
+
+def annotate(queryset, text):
+    """ Adds an annotation with the given text to each record of the given
+    :class:`QuerySet` of :class:`Record` objects. The annotations are
+    created with a single ``INSERT ... SELECT`` from the query, without
+    fetching the records.
+
+    :returns: the number of created annotations
+    """
+    try:
+        query, params = queryset.values("pk").query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+
+    cursor = connection.cursor()
+    cursor.execute("""
+        INSERT INTO %s (record_id, text, insertion_time)
+        SELECT record.id, %%s, %%s FROM (%s) AS record
+    """ % (models.Annotation._meta.db_table, query),
+        [text, now()] + list(params)
+    )
+    return cursor.rowcount
+
+
+def annotate_filenames(location, annotations):
+    """ Adds the given annotations to the records of the given
+    :class:`Location`. The annotations are an iterable of 2-tuples of the
+    filename of the record and the text of the annotation. Annotations for
+    filenames without a record are skipped.
+
+    The annotations are inserted in batches by joining them with the
+    records.
+
+    :returns: the number of created annotations
+    """
+    cursor = connection.cursor()
+    annotations = iter(annotations)
+    insertion_time = now()
+    count = 0
+    while True:
+        batch = list(islice(annotations, BATCH_SIZE))
+        if not batch:
+            break
+        filenames, texts = zip(*batch)
+        cursor.execute("""
+            INSERT INTO %s (record_id, text, insertion_time)
+            SELECT record.id, annotation.text, %%s
+            FROM unnest(%%s::text[], %%s::text[])
+                AS annotation (filename, text)
+            JOIN %s AS record ON record.filename = annotation.filename
+            WHERE record.location_id = %%s
+        """ % (models.Annotation._meta.db_table, models.Record._meta.db_table),
+            [insertion_time, list(filenames), list(texts), location.pk]
+        )
+        count += cursor.rowcount
+    return count
+
+
+# name of the temporary table to stash annotations in
+STASH_TABLE = "minv_annotation_stash"
+
+
+def stash_annotations(location):
+    """ Copies the annotations of the records of the given :class:`Location`
+    to a temporary table, keyed by the filename of the record. Together with
+    :func:`restore_annotations` this preserves the annotations when the
+    records are deleted and re-ingested. Both have to be called in the same
+    transaction.
+
+    :returns: the number of stashed annotations
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TEMPORARY TABLE %s ON COMMIT DROP AS
+        SELECT record.filename, annotation.text, annotation.insertion_time
+        FROM %s AS annotation
+        JOIN %s AS record ON record.id = annotation.record_id
+        WHERE record.location_id = %%s
+    """ % (
+        STASH_TABLE, models.Annotation._meta.db_table,
+        models.Record._meta.db_table
+    ), [location.pk])
+    count = cursor.rowcount
+    # temporary tables are not analyzed automatically
+    cursor.execute("ANALYZE %s" % STASH_TABLE)
+    return count
+
+
+def restore_annotations(location):
+    """ Re-attaches the annotations stashed by :func:`stash_annotations` to
+    the records of the given :class:`Location` with the same filenames in a
+    single statement and drops the temporary table. Annotations for
+    filenames without a record are dropped.
+
+    :returns: the number of restored annotations
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        INSERT INTO %s (record_id, text, insertion_time)
+        SELECT record.id, stash.text, stash.insertion_time
+        FROM %s AS stash
+        JOIN %s AS record ON record.filename = stash.filename
+        WHERE record.location_id = %%s
+    """ % (
+        models.Annotation._meta.db_table, STASH_TABLE,
+        models.Record._meta.db_table
+    ), [location.pk])
+    count = cursor.rowcount
+    cursor.execute("DROP TABLE %s" % STASH_TABLE)
+    return count
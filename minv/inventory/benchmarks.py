@@ -0,0 +1,91 @@
+# ------------------------------------------------------------------------------
+#
+# Project: Master Inventory <http://github.com/ESA-MInv/minv>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+# ------------------------------------------------------------------------------
+# Copyright (C) 2016 European Space Agency
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+from django.test import TestCase
+from django.utils.timezone import now
+from django.db import connection
+
+from minv.inventory import models
+from minv.inventory.testing import IngestMixIn
+from minv.inventory.search_index import filter_pattern
+from minv.utils import Timer
+
+
+# Benchmarks of the ingestion and the search. They are not run with the test
+# suite, but on demand via
+#
+#   python manage.py test minv.inventory.benchmarks
+
+
+class IngestBenchmark(IngestMixIn, TestCase):
+    benchmark_rows = 20000
+
+    def test_engines(self):
+        for engine in ("bulk_create", "copy"):
+            self.location.index_files.all().delete()
+            self.write_index_file(self.benchmark_rows)
+            timer = Timer()
+            self.assertEqual(self.ingest(engine), self.benchmark_rows)
+            print "%s: ingested %d records in %.3fs" % (
+                engine, self.benchmark_rows, timer.stop()
+            )
+
+
+class SearchIndexBenchmark(IngestMixIn, TestCase):
+    # raise to 10000000 for a representative benchmark
+    num_records = 100000
+
+    def test_patterns(self):
+        index_file = models.IndexFile.objects.create(
+            location=self.location, filename="benchmark",
+            begin_time=now(), end_time=now(), update_time=now()
+        )
+        cursor = connection.cursor()
+        cursor.execute(
+            "INSERT INTO inventory_record (location_id, index_file_id, "
+            "filename) SELECT %s, %s, 'LS05_' || md5(i::text) || '.zip' "
+            "FROM generate_series(1, %s) AS i",
+            [self.location.pk, index_file.pk, self.num_records]
+        )
+        cursor.execute("ANALYZE inventory_record")
+
+        qs = models.Record.objects.all()
+        for name, plain, pattern in (
+                ("prefix", {"filename__startswith": "LS05_ab"}, "LS05_ab*"),
+                ("suffix", {"filename__endswith": "ab.zip"}, "*ab.zip"),
+                ("infix", {"filename__contains": "abc"}, "*abc*")):
+            timer = Timer()
+            expected = qs.filter(**plain).count()
+            plain_time = timer.stop()
+            timer = Timer()
+            self.assertEqual(
+                filter_pattern(qs, "filename", pattern).count(), expected
+            )
+            print "%s search on %d records: %.3fs plain, %.3fs indexed" % (
+                name, self.num_records, plain_time, timer.stop()
+            )
@@ -26,6 +26,8 @@
 # ------------------------------------------------------------------------------
 
 
+from itertools import chain
+
 from minv import config
 from minv.utils import parse_duration
 
@@ -38,6 +40,20 @@ class CollectionConfigurationReader(config.Reader):
     harvest_interval = config.Option(type=parse_duration)
     available_result_list_fields = config.Option(default=None, separator=",")
     available_alignment_fields = config.Option(default=None, separator=",")
+    ingest_engine = config.Option(default="bulk_create")
+    ingest_processes = config.Option(type=int, default=1)
+    diff_ingest = config.Option(type=bool, default=False)
+    ingest_checkpoint_interval = config.Option(type=int, default=0)
+    ingest_max_attempts = config.Option(type=int, default=3)
+    footprint_cache_size = config.Option(type=int, default=10000)
+    retrieve_concurrency = config.Option(type=int, default=1)
+    http_pool_size = config.Option(type=int, default=4)
+    http_timeout = config.Option(type=float, default=None)
+    retrieve_retries = config.Option(type=int, default=3)
+    retrieve_backoff = config.Option(type=float, default=1.0)
+    result_list_pagination = config.Option(default="offset")
+    count_mode = config.Option(default="exact")
+    exact_count_threshold = config.Option(type=int, default=10000)
 
     default_metadata_mapping = config.SectionOption("metadata_mapping")
 
@@ -84,6 +100,105 @@ def check_collection_configuration(reader):
             % ", ".join(available_alignment_fields - alignment_fields)
         )
 
+    if reader.ingest_engine not in ("bulk_create", "copy"):
+        errors.append(
+            "Invalid inventory.ingest_engine setting '%s'. Must be one of "
+            "bulk_create, copy." % reader.ingest_engine
+        )
+
+    try:
+        reader.diff_ingest
+    except:
+        errors.append("Invalid inventory.diff_ingest setting.")
+
+    try:
+        if reader.ingest_processes < 1:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.ingest_processes setting.")
+
+    try:
+        if reader.ingest_checkpoint_interval < 0:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.ingest_checkpoint_interval setting.")
+
+    try:
+        if reader.ingest_max_attempts < 1:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.ingest_max_attempts setting.")
+
+    try:
+        if reader.footprint_cache_size < 0:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.footprint_cache_size setting.")
+
+    try:
+        if reader.retrieve_concurrency < 1:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.retrieve_concurrency setting.")
+
+    try:
+        if reader.http_pool_size < 1:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.http_pool_size setting.")
+
+    try:
+        if reader.http_timeout is not None and reader.http_timeout <= 0:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.http_timeout setting.")
+
+    try:
+        if reader.retrieve_retries < 0:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.retrieve_retries setting.")
+
+    try:
+        if reader.retrieve_backoff < 0:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.retrieve_backoff setting.")
+
+    if reader.result_list_pagination not in ("offset", "keyset"):
+        errors.append(
+            "Invalid inventory.result_list_pagination setting '%s'. Must be "
+            "one of offset, keyset." % reader.result_list_pagination
+        )
+
+    if reader.count_mode not in ("exact", "explain"):
+        errors.append(
+            "Invalid inventory.count_mode setting '%s'. Must be one of "
+            "exact, explain." % reader.count_mode
+        )
+
+    try:
+        if reader.exact_count_threshold < 0:
+            raise ValueError
+    except:
+        errors.append("Invalid inventory.exact_count_threshold setting.")
+
+    location_sections = [
+        section for section in reader._config.sections()
+        if section.startswith("location.")
+    ]
+    for section in location_sections:
+        try:
+            value = reader.get_section_dict(section).get(
+                "retrieve_concurrency"
+            )
+            if value is not None and int(value) < 1:
+                raise ValueError
+        except:
+            errors.append(
+                "Invalid [%s] retrieve_concurrency setting." % section
+            )
+
     mapping_sections = [
         section for section in reader._config.sections()
         if section.startswith("metadata_mapping")
@@ -118,6 +233,74 @@ def collection_configuration_changes(old, new):
         changes["inventory.available_alignment_fields"] = (
             old.available_alignment_fields, new.available_alignment_fields
         )
+    if old.ingest_engine != new.ingest_engine:
+        changes["inventory.ingest_engine"] = (
+            old.ingest_engine, new.ingest_engine
+        )
+    if old.ingest_processes != new.ingest_processes:
+        changes["inventory.ingest_processes"] = (
+            old.ingest_processes, new.ingest_processes
+        )
+    if old.diff_ingest != new.diff_ingest:
+        changes["inventory.diff_ingest"] = (
+            old.diff_ingest, new.diff_ingest
+        )
+    if old.ingest_checkpoint_interval != new.ingest_checkpoint_interval:
+        changes["inventory.ingest_checkpoint_interval"] = (
+            old.ingest_checkpoint_interval, new.ingest_checkpoint_interval
+        )
+    if old.ingest_max_attempts != new.ingest_max_attempts:
+        changes["inventory.ingest_max_attempts"] = (
+            old.ingest_max_attempts, new.ingest_max_attempts
+        )
+    if old.footprint_cache_size != new.footprint_cache_size:
+        changes["inventory.footprint_cache_size"] = (
+            old.footprint_cache_size, new.footprint_cache_size
+        )
+    if old.retrieve_concurrency != new.retrieve_concurrency:
+        changes["inventory.retrieve_concurrency"] = (
+            old.retrieve_concurrency, new.retrieve_concurrency
+        )
+    if old.http_pool_size != new.http_pool_size:
+        changes["inventory.http_pool_size"] = (
+            old.http_pool_size, new.http_pool_size
+        )
+    if old.http_timeout != new.http_timeout:
+        changes["inventory.http_timeout"] = (
+            old.http_timeout, new.http_timeout
+        )
+    if old.retrieve_retries != new.retrieve_retries:
+        changes["inventory.retrieve_retries"] = (
+            old.retrieve_retries, new.retrieve_retries
+        )
+    if old.retrieve_backoff != new.retrieve_backoff:
+        changes["inventory.retrieve_backoff"] = (
+            old.retrieve_backoff, new.retrieve_backoff
+        )
+    if old.result_list_pagination != new.result_list_pagination:
+        changes["inventory.result_list_pagination"] = (
+            old.result_list_pagination, new.result_list_pagination
+        )
+    if old.count_mode != new.count_mode:
+        changes["inventory.count_mode"] = (old.count_mode, new.count_mode)
+    if old.exact_count_threshold != new.exact_count_threshold:
+        changes["inventory.exact_count_threshold"] = (
+            old.exact_count_threshold, new.exact_count_threshold
+        )
+
+    location_sections = set(
+        section for section in chain(
+            old._config.sections(), new._config.sections()
+        ) if section.startswith("location.")
+    )
+    for section in sorted(location_sections):
+        old_values = old.get_section_dict(section)
+        new_values = new.get_section_dict(section)
+        for key in sorted(set(old_values) | set(new_values)):
+            if old_values.get(key) != new_values.get(key):
+                changes["%s.%s" % (section, key)] = (
+                    old_values.get(key), new_values.get(key)
+                )
 
     old_mapping_sections = set(
         section for section in old._config.sections()
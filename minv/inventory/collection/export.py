@@ -41,7 +41,9 @@ from django.db import transaction
 
 import minv
 from minv.inventory import models
-from minv.inventory.ingest import ingest
+from minv.inventory.ingest import ingest, index_file_path
+from minv.inventory.alignment import rebuild_alignment_index
+from minv.inventory.annotation import annotate_filenames
 from minv.utils import safe_makedirs
 from minv.tasks.registry import task
 from minv.tasks.api import schedule
@@ -139,13 +141,10 @@ def _export_collection_locked(collection, filename, configuration, data):
                     collection.data_dir, "ingested", location.slug
                 )
                 for index_file in location.index_files.all():
-                    arcname = join(
-                        "locations", location.slug, basename(index_file.filename)
-                    )
-                    archive.write(
-                        join(ingested_dir, index_file.filename),
-                        arcname=arcname
-                    )
+                    # the index file may be stored zipped
+                    path = index_file_path(ingested_dir, index_file.filename)
+                    arcname = join("locations", location.slug, basename(path))
+                    archive.write(path, arcname=arcname)
 
                 with tempfile.NamedTemporaryFile() as tmp_file:
                     writer = csv.writer(tmp_file)
@@ -254,13 +253,9 @@ def import_collection(filename, mission=None, file_type=None):
             with closing(archive.open(member)) as annotations:
                 reader = csv.reader(annotations)
                 next(reader)  # skip header
-                for record_filename, text in reader:
-                    models.Annotation.objects.create(
-                        record=models.Record.objects.get(
-                            location=location, filename=record_filename
-                        ),
-                        text=text
-                    )
+                annotate_filenames(location, reader)
+
+    rebuild_alignment_index(collection)
 
     return collection
 
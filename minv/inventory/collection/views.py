@@ -27,24 +27,23 @@
 
 
 from functools import wraps
-import tempfile
+import itertools
 import csv
 from os.path import basename, join
 
 from django.shortcuts import render
-from django.core.paginator import Paginator
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.utils.datastructures import SortedDict
 from django.utils.timezone import now
 from django.http import StreamingHttpResponse, Http404
-from django.db.models import Sum, Count
 from django.contrib.auth.decorators import permission_required, login_required
 
 from minv.config import backup_config
 from minv.inventory import models
 from minv.inventory import forms
 from minv.inventory import queries
+from minv.inventory.annotation import annotate
 from minv.inventory.collection.export import (
     export_collection, list_exports
 )
@@ -70,6 +69,51 @@ def check_collection(view):
     return wrapped
 
 
+class Echo(object):
+    """ Pseudo file object that just returns the written value, so that the
+    lines written by a :class:`csv.writer` can be streamed.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_chunks(lines, chunk_size=64 * 1024):
+    """ Joins the given lines to chunks of about ``chunk_size`` bytes to
+    stream them efficiently.
+    """
+    chunk = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def iter_csv(rows, delimiter=","):
+    """ Yields the given rows formatted as CSV in chunks.
+    """
+    writer = csv.writer(Echo(), delimiter=delimiter)
+    return iter_chunks(writer.writerow(row) for row in rows)
+
+
+def streaming_download(content, content_type, name, extension):
+    """ Returns a :class:`StreamingHttpResponse` for the given iterable of
+    chunks. The response has no ``Content-Length``, so it is sent with
+    chunked transfer encoding as it is generated.
+    """
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = 'inline; filename="%s-%s.%s"' % (
+        name, now().replace(microsecond=0, tzinfo=None).isoformat("T"),
+        extension
+    )
+    return response
+
+
 @login_required(login_url="login")
 def list_view(request):
     """ Django view function to show a list of registered collections.
@@ -193,16 +237,10 @@ def search_view(request, mission, file_type):
                 "search_overview", **search_data
             )
             with observer:
-                results = []
-                for location in locations:
-                    qs = queries.search(
-                        collection, search_data, location.records.all(),
-                        footprint_or_scene_centre == "footprint"
-                    )
-                    values = qs.aggregate(
-                        volume=Sum("filesize"), count=Count("filename")
-                    )
-                    results.append((location, values))
+                results = queries.search_overview(
+                    collection, search_data, locations,
+                    footprint_or_scene_centre == "footprint"
+                )
 
     else:
         search_form = forms.SearchForm(
@@ -276,6 +314,10 @@ def result_list_view(request, mission, file_type):
             )
 
             location = collection.locations.get(id=result_list_location_id)
+            search_key = queries.get_search_key(
+                location, search_data,
+                footprint_or_scene_centre == "footprint"
+            )
 
             observer = monitor(
                 "search_results", **search_data
@@ -295,7 +337,26 @@ def result_list_view(request, mission, file_type):
                 "records_per_page"
             )
 
-            result_list = Paginator(qs, per_page).page(page)
+            if config.result_list_pagination == "keyset" and \
+                    queries.supports_keyset_pagination(sort):
+                paginator = queries.KeysetPaginator(
+                    qs, per_page, sort, config.count_mode,
+                    config.exact_count_threshold, search_key
+                )
+                result_list = paginator.page(
+                    page, pagination_form.cleaned_data.pop("cursor", None)
+                )
+                # pass on the cursor of the displayed page, which is the
+                # first one when the search has changed
+                data = request.POST.copy()
+                data["page"] = result_list.number
+                data["cursor"] = result_list.cursor
+                pagination_form = forms.PaginationForm(data)
+            else:
+                result_list = queries.EstimatingPaginator(
+                    qs, per_page, config.count_mode,
+                    config.exact_count_threshold
+                ).page(page)
             result_list_location = location
 
             # see if we need to create annotations
@@ -314,11 +375,10 @@ def result_list_view(request, mission, file_type):
                 else:
                     annotation_qs = location.records.filter(pk__in=ids)
 
-                for record in annotation_qs:
-                    models.Annotation.objects.create(
-                        record=record,
-                        text=add_annotation_list_form.cleaned_data["text"]
-                    )
+                annotate(
+                    annotation_qs,
+                    add_annotation_list_form.cleaned_data["text"]
+                )
 
     else:
         search_form = forms.SearchForm(
@@ -335,48 +395,18 @@ def result_list_view(request, mission, file_type):
 
     if request.POST.get("download_csv"):
         keys = display_fields.keys()
-        f = tempfile.SpooledTemporaryFile()
-        writer = csv.writer(f, delimiter=",")
-        writer.writerow(
-            ["filename"] + keys
-        )
-        for record in qs:
-            writer.writerow([
-                record.filename
-            ] + [
-                getattr(record, key, "")
-                for key in keys
-            ])
-
-        size = f.tell()
-        f.seek(0)
-
-        response = StreamingHttpResponse(f, content_type="text/csv")
-        response["Content-Length"] = str(size)
-        response["Content-Disposition"] = (
-            'inline; filename="search-%s.csv"' % (
-                now().replace(microsecond=0, tzinfo=None).isoformat("T")
-            )
+        rows = queries.stream_values(qs, "filename", *keys)
+        return streaming_download(
+            iter_csv(itertools.chain([["filename"] + keys], rows)),
+            "text/csv", "search", "csv"
         )
-        return response
 
     elif request.POST.get("download_filenames"):
-        f = tempfile.SpooledTemporaryFile()
-        for record in qs:
-            f.write(record.filename)
-            f.write("\n")
-
-        size = f.tell()
-        f.seek(0)
-
-        response = StreamingHttpResponse(f, content_type="text/plain")
-        response["Content-Length"] = str(size)
-        response["Content-Disposition"] = (
-            'inline; filename="search-%s.txt"' % (
-                now().replace(microsecond=0, tzinfo=None).isoformat("T")
-            )
+        filenames = queries.stream_values(qs, "filename", flat=True)
+        return streaming_download(
+            iter_chunks(filename + "\n" for filename in filenames),
+            "text/plain", "search", "txt"
         )
-        return response
 
     else:
         # overwrite on purpose
@@ -441,16 +471,11 @@ def record_view(request, mission, file_type, filename):
         )
         if add_annotation_form.is_valid():
             data = add_annotation_form.cleaned_data
-            annotation_records = [
-                models.Record.objects.get(
-                    filename=filename, location=data["location"]
-                )
-            ] if data["location"] else records
-            for record in annotation_records:
-                models.Annotation.objects.create(
-                    record=record, text=data["text"]
-                )
-            pass
+            annotate(
+                records.filter(location=data["location"])
+                if data["location"] else records,
+                data["text"]
+            )
     else:
         add_annotation_form = forms.AddAnnotationForm(
             [record.location for record in records]
@@ -496,15 +521,11 @@ def annotation_add_view(request, mission, file_type, filename):
         )
         if form.is_valid():
             data = form.cleaned_data
-            annotation_records = [
-                models.Record.objects.get(
-                    filename=filename, location=data["location"]
-                )
-            ] if data["location"] else records
-            for record in annotation_records:
-                models.Annotation.objects.create(
-                    record=record, text=data["text"]
-                )
+            annotate(
+                records.filter(location=data["location"])
+                if data["location"] else records,
+                data["text"]
+            )
 
             messages.info(request, "Added annotation.")
         else:
@@ -562,7 +583,10 @@ def alignment_view(request, mission, file_type):
             per_page = pagination_form.cleaned_data.pop("records_per_page")
 
             if frmt == "html":
-                records = Paginator(qs, per_page).page(page)
+                records = queries.EstimatingPaginator(
+                    qs, per_page, config.count_mode,
+                    config.exact_count_threshold
+                ).page(page)
             else:
                 records = qs
 
@@ -590,9 +614,6 @@ def alignment_view(request, mission, file_type):
             }
         )
     elif frmt in ("csv", "tsv"):
-        f = tempfile.SpooledTemporaryFile()
-        writer = csv.writer(f, delimiter="," if frmt == "csv" else "\t")
-
         header = ["filename"]
         for location in locations:
             header.extend([
@@ -600,26 +621,20 @@ def alignment_view(request, mission, file_type):
                 "prevalence %s" % location.url
             ])
         header.append("annotations")
-        writer.writerow(header)
 
-        for row in qs:
-            writer.writerow(
-                [row["filename"]] +
-                [item for incidence in row["incidences"] for item in incidence] +
-                list(row["annotations"])
-            )
-
-        size = f.tell()
-        f.seek(0)
-
-        response = StreamingHttpResponse(f, content_type="text/csv")
-        response["Content-Length"] = str(size)
-        response["Content-Disposition"] = (
-            'inline; filename="alignment-%s.csv"' % (
-                now().replace(microsecond=0, tzinfo=None).isoformat("T")
-            )
+        rows = (
+            [row["filename"]] +
+            [item for incidence in row["incidences"] for item in incidence] +
+            list(row["annotations"])
+            for row in qs
+        )
+        return streaming_download(
+            iter_csv(
+                itertools.chain([header], rows),
+                delimiter="," if frmt == "csv" else "\t"
+            ),
+            "text/csv", "alignment", frmt
         )
-        return response
 
 
 @permission_required("inventory.can_export", raise_exception=True)
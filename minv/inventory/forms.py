@@ -284,6 +284,7 @@ class PaginationForm(forms.Form):
         required=False, choices=((5, "5"), (10, "10"), (15, "15"), (20, "20")),
         widget=forms.Select(attrs=attrs)
     )
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput())
 
 
 def create_formfield_for_model_field(model_field):
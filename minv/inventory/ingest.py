@@ -28,25 +28,41 @@
 
 import csv
 import os
-from os.path import basename, exists, join, dirname
+from os.path import basename, exists, join, dirname, getsize, splitext
 from datetime import datetime
 from urlparse import urlparse
+from cStringIO import StringIO
+from hashlib import md5
 import logging
 import traceback
-from itertools import islice
+from itertools import islice, izip
+from contextlib import closing
+from collections import OrderedDict
+from multiprocessing import Pool
+import zipfile
 
-from django.db import transaction
+from django.conf import settings
+from django.db import connection, transaction, InterfaceError, OperationalError
+from django.db.models import F
 from django.utils.dateparse import parse_datetime
-from django.utils.timezone import utc
+from django.utils.timezone import (
+    utc, is_naive, make_aware, get_default_timezone
+)
 from django.contrib.gis.db.models import (
     DateTimeField, CharField, MultiPolygonField, PointField, IntegerField,
     FloatField
 )
-from django.contrib.gis.geos import MultiPolygon, Polygon, Point
+from django.contrib.gis.geos import GEOSGeometry, MultiPolygon, Polygon, Point
 
 from minv.inventory import models
-from minv.geom_utils import fix_footprint, EmptyMultiPolygon
-from minv.utils import safe_makedirs
+from minv.inventory.statistics import (
+    add_index_file_statistics, update_location_statistics
+)
+from minv.inventory.alignment import (
+    update_alignment_index, update_index_file_alignment
+)
+from minv.geom_utils import fix_footprint, fix_footprints, EmptyMultiPolygon
+from minv.utils import safe_makedirs, Timer
 
 
 logger = logging.getLogger(__name__)
@@ -59,21 +75,93 @@ def parse_index_time(value):
 
 
 def parse_footprint(value):
-    # we must translate from y/x to x/y here
     try:
         rings = fix_footprint(value)[0]
     except EmptyMultiPolygon:
         return None
-    for ring in rings:
-        ring[:] = [
-            (point[1], point[0])
-            for point in ring
-        ]
+    return _footprint_geometry(rings)
+
+
+def parse_footprints(values):
+    """ Batch version of :func:`parse_footprint`, fixing all footprints of
+    a chunk at once.
+    """
+    geometries = []
+    for result in fix_footprints(values, return_errors=True):
+        if isinstance(result, EmptyMultiPolygon):
+            geometries.append(None)
+        elif isinstance(result, Exception):
+            raise result
+        else:
+            geometries.append(_footprint_geometry(result[0]))
+    return geometries
+
+
+def _footprint_geometry(rings):
+    # we must translate from y/x to x/y here
     return MultiPolygon(
-        Polygon(*rings)
+        Polygon(*[[(x, y) for y, x in ring] for ring in rings])
     )
 
 
+class FootprintCache(object):
+    """ Bounded LRU cache of prepared footprint geometries, keyed by the raw
+    footprint strings of the index files. The geometries are stored as hex
+    encoded EWKB, which is accepted by both ingestion engines. The numbers of
+    cache hits and misses are counted in :attr:`hits` and :attr:`misses`.
+    """
+
+    def __init__(self, size, srid=4326):
+        self.size = size
+        self.srid = srid
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def parse(self, value):
+        """ Cached version of :func:`parse_footprint`. """
+        return self.parse_many([value])[0]
+
+    def parse_many(self, values):
+        """ Cached version of :func:`parse_footprints`. """
+        items = self._items
+        results = []
+        missing = {}
+        for i, value in enumerate(values):
+            try:
+                result = items.pop(value)
+            except KeyError:
+                missing.setdefault(value, []).append(i)
+                result = None
+            else:
+                # re-insert as the most recently used item
+                items[value] = result
+                self.hits += 1
+            results.append(result)
+
+        if missing:
+            values = missing.keys()
+            for value, geometry in izip(values, parse_footprints(values)):
+                if geometry is not None:
+                    geometry.srid = self.srid
+                    geometry = geometry.hexewkb
+                for i in missing[value]:
+                    results[i] = geometry
+                items[value] = geometry
+                # repeated values within the same call are hits as well
+                self.hits += len(missing[value]) - 1
+            self.misses += len(values)
+
+            # evict the least recently used items
+            while len(items) > self.size:
+                items.popitem(last=False)
+
+        return results
+
+    def __str__(self):
+        return "footprint cache: %d hits, %d misses" % (self.hits, self.misses)
+
+
 def parse_point(value):
     if not value:
         return None
@@ -92,16 +180,516 @@ def parse_float(value):
     return float(value)
 
 
+def parse_filename(value):
+    return basename(urlparse(value).path)
+
+
+def parse_choice(value):
+    return value[0].upper() if len(value) else None
+
+
+def get_field_parser(name):
+    """ Get the function to parse the raw index file values for the
+    :class:`Record` field with the given name. Returns ``None`` if the raw
+    value can be used as-is.
+    """
+    if name == "filename":
+        return parse_filename
+
+    field = models.Record._meta.get_field(name)
+    if isinstance(field, DateTimeField):
+        return parse_datetime  # TODO: necessary?
+    elif isinstance(field, CharField) and field.choices:
+        return parse_choice
+    elif isinstance(field, MultiPolygonField):
+        return parse_footprint
+    elif isinstance(field, PointField):
+        return parse_point
+    elif isinstance(field, IntegerField):
+        return parse_integer
+    elif isinstance(field, FloatField):
+        return parse_float
+    return None
+
+
+# parsers converting whole columns of a chunk of rows at once
+BATCH_PARSERS = {
+    parse_footprint: parse_footprints,
+}
+
+
+class RowConverter(object):
+    """ Converter for the rows of index files to lists of prepared values
+    for the :class:`Record` fields of a metadata mapping.
+
+    The field parsers are resolved once for the mapping. Using :meth:`bind`
+    the column indices of the mapped fields are resolved from the header of an
+    index file, resulting in a function converting the rows of that file, as
+    read by ``csv.reader``. :meth:`bind_many` does the same for whole chunks of
+    rows, using the batch parsers where available.
+
+    With a :class:`FootprintCache` the footprints are parsed through the
+    cache.
+    """
+
+    def __init__(self, mapping, footprint_cache=None):
+        self.fields = tuple(target for target, _ in mapping)
+        self.sources = tuple(source for _, source in mapping)
+        self.footprint_cache = footprint_cache
+        self.batch_parsers = dict(BATCH_PARSERS)
+
+        parsers = []
+        for target in self.fields:
+            parser = get_field_parser(target) or _identity
+            if parser is parse_footprint and footprint_cache is not None:
+                parser = footprint_cache.parse
+                self.batch_parsers[parser] = footprint_cache.parse_many
+            parsers.append(parser)
+        self.parsers = tuple(parsers)
+
+    def bind(self, header, index_file_name=None):
+        """ Get the conversion function for rows of an index file with the
+        given header. Raises an :class:`IngestionError` if a mapped column is
+        missing.
+        """
+        return self._bind(header, index_file_name, self.parsers)
+
+    def bind_many(self, header, index_file_name=None):
+        """ Get the conversion function for lists of rows of an index file
+        with the given header. The columns with a batch parser are converted
+        for all rows of the list at once.
+        """
+        batch_parsers = self.batch_parsers
+        batched = [
+            (i, batch_parsers[parser])
+            for i, parser in enumerate(self.parsers) if parser in batch_parsers
+        ]
+        convert = self._bind(header, index_file_name, [
+            _identity if parser in batch_parsers else parser
+            for parser in self.parsers
+        ])
+
+        def convert_many(rows):
+            rows = [convert(row) for row in rows]
+            for i, parser in batched:
+                for row, value in izip(rows, parser([row[i] for row in rows])):
+                    row[i] = value
+            return rows
+
+        return convert_many
+
+    def _bind(self, header, index_file_name, parsers):
+        columns = dict((name, i) for i, name in enumerate(header))
+        for source in self.sources:
+            if source not in columns:
+                raise IngestionError(
+                    "Index file '%s' has no such field '%s'."
+                    % (index_file_name, source)
+                )
+
+        items = tuple(
+            (columns[source], parser)
+            for source, parser in zip(self.sources, parsers)
+        )
+        width = len(header)
+        padding = [None] * width
+
+        def convert(row):
+            # fill up rows with missing trailing values
+            if len(row) < width:
+                row = row + padding[len(row):]
+            return [parser(row[index]) for index, parser in items]
+
+        return convert
+
+
+def _identity(value):
+    return value
+
+
 class IngestError(Exception):
     pass
 
 
-@transaction.atomic
-def ingest(mission, file_type, url, index_file_name):
+class BulkCreateLoader(object):
+    """ Loader to store rows of prepared values as :class:`Record` models via
+    ``bulk_create``.
+    """
+    def __init__(self, location, index_file, fields):
+        self.location = location
+        self.index_file = index_file
+        self.fields = tuple(fields)
+
+    def load(self, rows):
+        models.Record.objects.bulk_create([
+            models.Record(
+                location=self.location, index_file=self.index_file,
+                **dict(zip(self.fields, row))
+            )
+            for row in rows
+        ])
+
+
+def _copy_escape(value):
+    """ Escape a string for the PostgreSQL ``COPY`` text format.
+    """
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace(
+        "\n", "\\n"
+    ).replace("\r", "\\r")
+
+
+def _copy_serializer(field):
+    """ Get a function to serialize a prepared value of the given model field
+    for the PostgreSQL ``COPY`` text format.
+    """
+    if isinstance(field, (MultiPolygonField, PointField)):
+        srid = field.srid
+
+        def serialize(value):
+            if isinstance(value, basestring):
+                # already prepared as hex EWKB by the FootprintCache
+                return value
+            if not isinstance(value, GEOSGeometry):
+                value = GEOSGeometry(value)
+            if value.srid is None:
+                value.srid = srid
+            return value.hexewkb
+
+    elif isinstance(field, DateTimeField):
+        def serialize(value):
+            if isinstance(value, basestring):
+                value = parse_datetime(value)
+            if settings.USE_TZ and is_naive(value):
+                value = make_aware(value, get_default_timezone())
+            return value.isoformat()
+
+    elif isinstance(field, FloatField):
+        serialize = repr
+
+    elif isinstance(field, IntegerField):
+        serialize = str
+
+    else:
+        def serialize(value):
+            if isinstance(value, unicode):
+                value = value.encode("utf-8")
+            return _copy_escape(value)
+
+    return serialize
+
+
+class CopyLoader(object):
+    """ Loader to stream rows of prepared values directly into the records
+    table via PostgreSQL's ``COPY ... FROM STDIN``, skipping the instantiation
+    of models altogether. Geometries are transferred as hex encoded EWKB.
+    The rows can be copied to another ``table`` with the same columns, too.
+    """
+    def __init__(self, location, index_file, fields, table=None):
+        meta = models.Record._meta
+        self.table = table or meta.db_table
+        self.columns = ["location_id", "index_file_id"] + [
+            meta.get_field(name).column for name in fields
+        ]
+        self.serializers = tuple(
+            _copy_serializer(meta.get_field(name)) for name in fields
+        )
+        self.prefix = "%d\t%d\t" % (location.pk, index_file.pk)
+
+    def load(self, rows):
+        serializers = self.serializers
+        prefix = self.prefix
+        buf = StringIO()
+        for row in rows:
+            buf.write(prefix)
+            buf.write("\t".join([
+                "\\N" if value is None else serialize(value)
+                for serialize, value in zip(serializers, row)
+            ]))
+            buf.write("\n")
+        buf.seek(0)
+
+        cursor = connection.cursor()
+        cursor.copy_expert(
+            "COPY %s (%s) FROM STDIN" % (
+                self.table, ", ".join(self.columns)
+            ), buf
+        )
+
+
+INGEST_ENGINES = {
+    "bulk_create": BulkCreateLoader,
+    "copy": CopyLoader,
+}
+
+
+def get_footprint_cache(configuration):
+    """ Create the :class:`FootprintCache` shared by the rows of an ingestion
+    run, as configured for the collection. Returns ``None`` if disabled.
+    """
+    size = configuration.footprint_cache_size
+    if not size:
+        return None
+    return FootprintCache(
+        size, models.Record._meta.get_field("footprint").srid
+    )
+
+
+def create_index_file(location, index_file_name):
+    """ Create and save the :class:`IndexFile` model for the given index file
+    name, parsing the time information from the file name.
+    """
+    s, e, u = basename(index_file_name).partition(".")[0].split("_")
+    index_file = models.IndexFile(
+        filename=index_file_name, location=location,
+        begin_time=parse_index_time(s), end_time=parse_index_time(e),
+        update_time=parse_index_time(u)
+    )
+    index_file.full_clean()
+    index_file.save()
+    return index_file
+
+
+def index_file_path(dir_path, index_file_name):
+    """ Get the path of the index file with the given name within the
+    directory. Index files are either stored as they are or zipped, as
+    ``<index-file-name>.zip``, in which case the path of the zip archive is
+    returned.
+    """
+    path = join(dir_path, index_file_name)
+    if not exists(path) and exists(path + ".zip"):
+        return path + ".zip"
+    return path
+
+
+def get_index_file_name(path):
+    """ Get the name of the index file at the given path, which is the name
+    of the file without the ``.zip`` extension of zipped index files.
+    """
+    name = basename(path)
+    return splitext(name)[0] if name.endswith(".zip") else name
+
+
+class ZippedIndexFile(object):
+    """ Read-only file-like object for an index file within a zip archive,
+    decompressed while reading. As for plain files, :meth:`tell` returns the
+    offset within the (decompressed) index file and :meth:`seek` can be used
+    to move to such an offset again.
+    """
+
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path)
+        names = self.archive.namelist()
+        name = get_index_file_name(path)
+        if name not in names and len(names) == 1:
+            name = names[0]
+        self.info = self.archive.getinfo(name)
+        self._file = self.archive.open(self.info)
+        self._offset = 0
+
+    @property
+    def size(self):
+        return self.info.file_size
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self._offset += len(data)
+        return data
+
+    def readline(self, size=-1):
+        line = self._file.readline(size)
+        self._offset += len(line)
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+    def tell(self):
+        return self._offset
+
+    def seek(self, offset, whence=0):
+        if whence != 0:
+            raise IOError("Only absolute seeking is supported.")
+        if offset < self._offset:
+            # start decompressing from the beginning again
+            self._file.close()
+            self._file = self.archive.open(self.info)
+            self._offset = 0
+        while self._offset < offset:
+            if not self.read(min(offset - self._offset, 1024 * 1024)):
+                break
+
+    def close(self):
+        self._file.close()
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_index_file(path):
+    """ Open the index file at the given path for reading. Zipped index files
+    are read from the zip archive directly, without extracting them first.
+    """
+    if path.endswith(".zip"):
+        return ZippedIndexFile(path)
+    return open(path)
+
+
+RANGE_SIZE = 8 * 1024 * 1024  # 8MB byte ranges for parallel parsing
+
+
+def split_index_file(path, offset=0, range_size=RANGE_SIZE):
+    """ Split the file at ``path`` starting from ``offset`` into a list of
+    ``(start, end)`` byte ranges of roughly ``range_size``. All ranges start
+    and end on line boundaries.
+    """
+    size = getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = offset
+        while start < size:
+            end = start + range_size
+            if end < size:
+                # advance to the end of the line containing the last byte
+                f.seek(end - 1)
+                f.readline()
+                end = f.tell()
+            else:
+                end = size
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def iter_lines(f, end=None):
+    """ Iterate over the lines of the file ``f`` starting from its current
+    position until the byte offset ``end`` (or the end of the file) is
+    reached.
+    """
+    pos = f.tell()
+    while end is None or pos < end:
+        line = f.readline()
+        if not line:
+            break
+        pos += len(line)
+        yield line
+
+
+def read_rows(lines):
+    """ Parse the tab separated rows of the given lines of an index file.
+    Blank lines are skipped.
+    """
+    for row in csv.reader(lines, delimiter="\t"):
+        if not row:
+            continue
+        yield row
+
+
+def _convert_range(args):
+    """ Worker function to parse and convert all rows within a byte range of
+    an index file.
+    """
+    path, start, end, mapping, header, index_file_name, cache_size = args
+    cache = FootprintCache(cache_size) if cache_size else None
+    convert = RowConverter(mapping, cache).bind_many(header, index_file_name)
+    with open(path, "rb") as f:
+        f.seek(start)
+        rows = convert(
+            list(read_rows(iter_lines(f, end)))
+        )
+    if cache:
+        return rows, cache.hits, cache.misses
+    return rows, 0, 0
+
+
+# number of rows to convert and load at once
+CHUNK_SIZE = 5000
+
+
+def iter_chunks(f, convert, path, mapping, header, index_file_name,
+                processes=1, chunk_size=None, footprint_cache=None):
+    """ Iterate over the remaining rows of the opened index file ``f`` in
+    chunks of rows converted by ``convert``, as returned by
+    :meth:`RowConverter.bind_many`. Yields 2-tuples of the list of converted
+    rows and the byte offset in the file after the last row of the chunk.
+    Chunks have at most ``chunk_size`` rows.
+
+    With more than one ``processes``, the rows of line aligned byte ranges of
+    the index file are parsed and converted in a pool of worker processes,
+    unless the index file is zipped and thus can only be read sequentially. The
+    chunks are still yielded in order. As the offset is only known at the end
+    of each byte range, it is ``None`` for the other chunks. Each worker then
+    uses a footprint cache of its own, with the size of the
+    ``footprint_cache``, and its statistics are added to those of the
+    ``footprint_cache``.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    if processes > 1 and not isinstance(f, ZippedIndexFile):
+        ranges = split_index_file(path, f.tell())
+        cache_size = footprint_cache.size if footprint_cache else 0
+        pool = Pool(processes)
+        try:
+            chunks = pool.imap(_convert_range, [
+                (path, start, end, mapping, header, index_file_name,
+                 cache_size)
+                for start, end in ranges
+            ])
+            for (rows, hits, misses), (_, end) in izip(chunks, ranges):
+                if footprint_cache:
+                    footprint_cache.hits += hits
+                    footprint_cache.misses += misses
+                for i in range(0, len(rows), chunk_size):
+                    yield rows[i:i + chunk_size], (
+                        end if i + chunk_size >= len(rows) else None
+                    )
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        reader = read_rows(iter_lines(f))
+        while True:
+            rows = convert(list(islice(reader, chunk_size)))
+            if not rows:
+                break
+            yield rows, f.tell()
+
+
+def ingest(mission, file_type, url, index_file_name, engine=None,
+           processes=None, checkpoint_interval=None):
     """ Function to ingest an indexfile into the collection identified by
     ``mission`` and ``file_type``. The indexfile must be located in the
     ``pending`` folder of the collections data directory.
-    When ingested correctly, the index
+    When ingested correctly, the index file is moved to the ``ingested``
+    folder, otherwise to the ``failed`` folder. Zipped index files
+    (``<index-file-name>.zip``) are read from the zip archive directly and
+    are kept zipped.
+
+    The records are stored using the ingestion ``engine``: either
+    ``"bulk_create"`` or ``"copy"``. By default, the engine configured for the
+    collection is used.
+
+    With more than one ``processes``, the rows of the index file are parsed
+    in a pool of worker processes, while the records are still stored in
+    order within this process and its transaction. By default, the number of
+    processes configured for the collection is used.
+
+    By default, the index file is ingested in a single transaction. With a
+    ``checkpoint_interval`` (or one configured for the collection) the
+    records are committed in batches of at least that many rows, recording
+    the reached byte offset and row count in the :class:`IndexFile`. When
+    the ingestion fails with a transient error after a checkpoint, the index
+    file stays in the ``pending`` folder and the next ingestion of it resumes
+    from the last checkpoint, up to the configured number of attempts. Any
+    other failure discards the ingested records and moves the index file to
+    the ``failed`` folder. The index file is only marked as complete when all
+    its rows are ingested.
+
+    Checkpoints require autocommit: within a transaction, e.g. of a reload,
+    they would only be savepoints rolled back along with it. There, the index
+    file is ingested in that transaction instead.
     """
 
     collection = models.Collection.objects.get(
@@ -109,6 +697,16 @@ def ingest(mission, file_type, url, index_file_name):
     )
     location = models.Location.objects.get(url=url, collection=collection)
 
+    configuration = collection.configuration
+    engine = engine or configuration.ingest_engine
+    if engine not in INGEST_ENGINES:
+        raise IngestError("Invalid ingestion engine '%s'." % engine)
+    processes = processes or configuration.ingest_processes
+    checkpoint_interval = (
+        checkpoint_interval or configuration.ingest_checkpoint_interval
+    )
+    footprint_cache = get_footprint_cache(configuration)
+
     # directories for index files
     pending_dir = join(collection.data_dir, "pending", location.slug)
     ingested_dir = join(collection.data_dir, "ingested", location.slug)
@@ -124,29 +722,267 @@ def ingest(mission, file_type, url, index_file_name):
     for dir_path in (pending_dir, ingested_dir, failed_dir):
         safe_makedirs(dir_path)
 
-    path = join(pending_dir, index_file_name)
+    path = index_file_path(pending_dir, index_file_name)
     if not exists(path):
         raise IngestError(
             "No such index file in pending directory: %s" % index_file_name
         )
+    # zipped index files are referred to by the name of the index file
+    index_file_name = get_index_file_name(path)
+
+    if checkpoint_interval and connection.in_atomic_block:
+        checkpoint_interval = 0
+
+    # an incompletely ingested index file is always resumed, even when
+    # checkpoints are no longer configured
+    if not checkpoint_interval and location.index_files.filter(
+            filename=index_file_name, complete=False).exists():
+        checkpoint_interval = CHUNK_SIZE
+
+    timer = Timer()
+    count = 0
+    try:
+        mapping = collection.get_metadata_field_mapping(url).items()
+
+        if not mapping:
+            raise IngestError("No metadata mapping configured for %s/%s %s"
+                % (mission, file_type, url)
+            )
+
+        converter = RowConverter(mapping, footprint_cache)
+
+        with open_index_file(path) as f:
+            # read the header line by itself, so that the offset of the first
+            # row is known
+            header = next(csv.reader([f.readline()], delimiter="\t"), [])
+            convert = converter.bind_many(header, index_file_name)
+
+            if checkpoint_interval:
+                count = _ingest_checkpointed(
+                    f, convert, path, mapping, header, location,
+                    index_file_name, converter.fields, engine, processes,
+                    checkpoint_interval, footprint_cache
+                )
+            else:
+                with transaction.atomic():
+                    index_file = create_index_file(location, index_file_name)
+                    loader = INGEST_ENGINES[engine](
+                        location, index_file, converter.fields
+                    )
+                    chunks = iter_chunks(
+                        f, convert, path, mapping, header, index_file_name,
+                        processes, footprint_cache=footprint_cache
+                    )
+                    with closing(chunks):
+                        for rows, _ in chunks:
+                            # save the next chunk of records to the DB
+                            loader.load(rows)
+                            count += len(rows)
+                            logger.debug(
+                                "Ingested chunk of %d records. "
+                                "Current total %d records" % (len(rows), count)
+                            )
+                    add_index_file_statistics(index_file)
+                    update_index_file_alignment(index_file)
+
+    except Exception as exc:
+        if checkpoint_interval and _can_resume(
+                location, index_file_name, exc,
+                configuration.ingest_max_attempts):
+            # keep the file in the pending directory to resume the ingestion
+            logger.error(
+                "Failed to ingest index file %s for %s (%s). The ingestion "
+                "can be resumed from the last checkpoint. Error was: %s"
+                % (index_file_name, collection, location.url, exc)
+            )
+        else:
+            # move file to failed directory
+            os.rename(path, join(failed_dir, basename(path)))
+            logger.error(
+                "Failed to ingest index file %s for %s (%s). Error was: %s"
+                % (index_file_name, collection, location.url, exc)
+            )
+        logger.debug(traceback.format_exc())
+        raise IngestionError(
+            "Failed to ingest index file %s for %s (%s). Error was: %s"
+            % (index_file_name, collection, location.url, exc)
+        )
+    else:
+        # move file to ingested directory, zipped index files are kept zipped
+        os.rename(path, join(ingested_dir, basename(path)))
+        logger.info(
+            "Successfully ingested index file %s for %s (%s) with %d records "
+            "in %.3fs using the '%s' engine%s"
+            % (
+                index_file_name, collection, location.url, count,
+                timer.stop(), engine,
+                " (%s)" % footprint_cache if footprint_cache else ""
+            )
+        )
+
+    return count
 
+
+def _ingest_checkpointed(f, convert, path, mapping, header, location,
+                         index_file_name, fields, engine, processes,
+                         checkpoint_interval, footprint_cache=None):
+    """ Helper to ingest the rows of the opened index file ``f`` in batches of
+    at least ``checkpoint_interval`` rows, each committed in its own
+    transaction along with the reached checkpoint. Resumes the ingestion of an
+    incomplete :class:`IndexFile` from its last checkpoint. Returns the total
+    number of ingested records.
+    """
     try:
-        # parse index file name info
-        s, e, u = basename(index_file_name).partition(".")[0].split("_")
-        index_file = models.IndexFile(
-            filename=index_file_name, location=location,
-            begin_time=parse_index_time(s), end_time=parse_index_time(e),
-            update_time=parse_index_time(u)
+        index_file = location.index_files.get(filename=index_file_name)
+    except models.IndexFile.DoesNotExist:
+        with transaction.atomic():
+            index_file = create_index_file(location, index_file_name)
+            index_file.complete = False
+            index_file.checkpoint_offset = f.tell()
+            index_file.save()
+    else:
+        if index_file.complete:
+            raise IngestError(
+                "Index file %s is already ingested." % index_file_name
+            )
+        logger.info(
+            "Resuming ingestion of index file %s from row %d"
+            % (index_file_name, index_file.checkpoint_count)
         )
-        index_file.full_clean()
-        index_file.save()
 
-        # prepare value "preparators"
-        meta = models.Record._meta
-        preparations = {
-            "filename": lambda v: basename(urlparse(v).path)
-        }
+    f.seek(index_file.checkpoint_offset)
+    count = index_file.checkpoint_count
+    loader = INGEST_ENGINES[engine](location, index_file, fields)
+
+    def checkpoint(batch, offset, complete=False):
+        with transaction.atomic():
+            for i in range(0, len(batch), CHUNK_SIZE):
+                loader.load(batch[i:i + CHUNK_SIZE])
+            models.IndexFile.objects.filter(pk=index_file.pk).update(
+                checkpoint_offset=offset,
+                checkpoint_count=count + len(batch),
+                complete=complete
+            )
+            if complete:
+                add_index_file_statistics(index_file)
+                update_index_file_alignment(index_file)
+        logger.debug(
+            "Ingested batch of %d records. Checkpoint at row %d, offset %d"
+            % (len(batch), count + len(batch), offset)
+        )
+        return count + len(batch)
+
+    batch = []
+    offset = index_file.checkpoint_offset
+    chunks = iter_chunks(
+        f, convert, path, mapping, header, index_file_name, processes,
+        footprint_cache=footprint_cache
+    )
+    with closing(chunks):
+        for rows, chunk_offset in chunks:
+            batch.extend(rows)
+            # checkpoints can only be made where the offset is known
+            if chunk_offset is None:
+                continue
+            offset = chunk_offset
+            if len(batch) >= checkpoint_interval:
+                count = checkpoint(batch, offset)
+                batch = []
+
+    # finally mark the index file as complete
+    return checkpoint(batch, offset, True)
+
+
+# errors after which a checkpointed ingestion is resumed, all others are
+# considered to fail again
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, EnvironmentError)
+
 
+def _can_resume(location, index_file_name, exc, max_attempts):
+    """ Helper to decide whether the failed checkpointed ingestion of an index
+    file can be resumed: only when it failed with a transient error after a
+    checkpoint was reached, and at most ``max_attempts`` times. Otherwise the
+    incomplete :class:`IndexFile` is deleted along with its records.
+    """
+    index_file = location.index_files.filter(
+        filename=index_file_name, complete=False
+    ).first()
+    if index_file is None:
+        return False
+
+    if (isinstance(exc, TRANSIENT_ERRORS) and index_file.checkpoint_count and
+            index_file.failed_attempts + 1 < max_attempts):
+        models.IndexFile.objects.filter(pk=index_file.pk).update(
+            failed_attempts=F("failed_attempts") + 1
+        )
+        return True
+
+    with transaction.atomic():
+        index_file.delete()
+    return False
+
+
+def iter_hashed_rows(f):
+    """ Iterate over the remaining rows of the index file ``f``. Yields
+    2-tuples of the hash of the raw line and the parsed row.
+    """
+    last_line = [None]
+
+    def lines():
+        for line in f:
+            last_line[0] = line
+            yield line
+
+    for row in read_rows(lines()):
+        yield md5(last_line[0].rstrip("\r\n")).digest(), row
+
+
+@transaction.atomic
+def ingest_diff(mission, file_type, url, old_index_file_name,
+                index_file_name, engine=None):
+    """ Function to ingest an updated indexfile into the collection identified
+    by ``mission`` and ``file_type`` by only applying the differences to the
+    already ingested index file ``old_index_file_name``. The updated index file
+    must be located in the ``pending`` folder of the collections data
+    directory, the old one in the ``ingested`` folder.
+
+    The rows of both files are compared by the records filename and a hash of
+    the row: new records are inserted, changed records updated and records
+    no longer present deleted. Unchanged records, along with their
+    annotations, are kept and assigned to the new index file, which then
+    replaces the old one.
+    """
+
+    collection = models.Collection.objects.get(
+        mission=mission, file_type=file_type
+    )
+    location = models.Location.objects.get(url=url, collection=collection)
+
+    engine = engine or collection.configuration.ingest_engine
+    if engine not in INGEST_ENGINES:
+        raise IngestError("Invalid ingestion engine '%s'." % engine)
+    footprint_cache = get_footprint_cache(collection.configuration)
+
+    # directories for index files
+    pending_dir = join(collection.data_dir, "pending", location.slug)
+    ingested_dir = join(collection.data_dir, "ingested", location.slug)
+    failed_dir = join(collection.data_dir, "failed", location.slug)
+
+    for dir_path in (pending_dir, ingested_dir, failed_dir):
+        safe_makedirs(dir_path)
+
+    path = index_file_path(pending_dir, index_file_name)
+    if not exists(path):
+        raise IngestError(
+            "No such index file in pending directory: %s" % index_file_name
+        )
+    index_file_name = get_index_file_name(path)
+
+    old_path = index_file_path(ingested_dir, old_index_file_name)
+    old_index_file = location.index_files.get(filename=old_index_file_name)
+
+    timer = Timer()
+    try:
         mapping = collection.get_metadata_field_mapping(url).items()
 
         if not mapping:
@@ -154,71 +990,104 @@ def ingest(mission, file_type, url, index_file_name):
                 % (mission, file_type, url)
             )
 
-        for target, _ in mapping:
-            field = meta.get_field(target)
-            if isinstance(field, DateTimeField):
-                preparations[target] = parse_datetime  # TODO: necessary?
-            elif isinstance(field, CharField) and field.choices:
-                preparations[target] = lambda value: value[0].upper() if len(value) else None
-            elif isinstance(field, MultiPolygonField):
-                preparations[target] = parse_footprint
-            elif isinstance(field, PointField):
-                preparations[target] = parse_point
-            elif isinstance(field, IntegerField):
-                preparations[target] = parse_integer
-            elif isinstance(field, FloatField):
-                preparations[target] = parse_float
+        converter = RowConverter(mapping, footprint_cache)
+        if "filename" not in converter.fields:
+            raise IngestError("No filename mapping configured for %s/%s %s"
+                % (mission, file_type, url)
+            )
+        filename_source = converter.sources[converter.fields.index("filename")]
+
+        # collect the row hashes of the old index file by filename
+        with open_index_file(old_path) as f:
+            header = next(csv.reader([f.readline()], delimiter="\t"), [])
+            if filename_source not in header:
+                raise IngestionError(
+                    "Index file '%s' has no such field '%s'."
+                    % (old_index_file_name, filename_source)
+                )
+            filename_index = header.index(filename_source)
+            old_hashes = dict(
+                (parse_filename(row[filename_index]), row_hash)
+                for row_hash, row in iter_hashed_rows(f)
+            )
+
+        index_file = create_index_file(location, index_file_name)
+        loader = INGEST_ENGINES[engine](
+            location, index_file, converter.fields
+        )
+
+        # the changed rows are collected in a temporary table to update their
+        # records at once
+        cursor = connection.cursor()
+        cursor.execute(
+            "CREATE TEMPORARY TABLE %s ON COMMIT DROP AS "
+            "SELECT * FROM %s WITH NO DATA"
+            % (DIFF_TABLE, models.Record._meta.db_table)
+        )
+        diff_loader = CopyLoader(
+            location, old_index_file, converter.fields, DIFF_TABLE
+        )
 
         count = 0
-        with open(path) as f:
-            reader = csv.DictReader(f, delimiter="\t")
+        inserted = []
+        changed = []
+        num_inserted = 0
+        with open_index_file(path) as f:
+            header = next(csv.reader([f.readline()], delimiter="\t"), [])
+            convert = converter.bind(header, index_file_name)
+            filename_index = header.index(filename_source)
 
-            while True:
-                records = []
+            for row_hash, row in iter_hashed_rows(f):
+                count += 1
+                filename = parse_filename(row[filename_index])
+                old_hash = old_hashes.pop(filename, None)
+                if old_hash == row_hash:
+                    continue
 
-                # iterate the files rows in chunks
-                row = None
-                chunk = islice(reader, 5000)
+                values = convert(row)
+                if old_hash is None:
+                    inserted.append(values)
+                    if len(inserted) >= CHUNK_SIZE:
+                        loader.load(inserted)
+                        num_inserted += len(inserted)
+                        inserted = []
+                else:
+                    changed.append(values)
+                    if len(changed) >= CHUNK_SIZE:
+                        diff_loader.load(changed)
+                        changed = []
 
-                for row in chunk:
-                    record = models.Record(
-                        index_file=index_file, location=location
-                    )
-                    for target, source in mapping:
-                        try:
-                            value = row[source]
-                        except KeyError:
-                            raise IngestionError(
-                                "Index file '%s' has no such field '%s'."
-                                % (index_file_name, source)
-                            )
-                        preparator = preparations.get(target)
-                        if preparator:
-                            value = preparator(value)
+            if inserted:
+                loader.load(inserted)
+                num_inserted += len(inserted)
+            if changed:
+                diff_loader.load(changed)
 
-                        setattr(record, target, value)
+        num_updated = _update_changed_records(
+            cursor, old_index_file, converter.fields
+        )
+        cursor.execute("DROP TABLE %s" % DIFF_TABLE)
 
-                    records.append(record)
-                    count += 1
+        # all kept records are now part of the new index file
+        location.records.filter(index_file=old_index_file).update(
+            index_file=index_file
+        )
 
-                # check if the slice was empty and exit when the last line of the
-                # was read.
-                if row is None:
-                    break
-                else:
-                    # save the next chunk of models to the DB
-                    models.Record.objects.bulk_create(records)
-                    logger.debug(
-                        "Ingested chunk of %d records. "
-                        "Current total %d records" % (len(records), count)
-                    )
+        # delete the records that are no longer present
+        deleted = old_hashes.keys()
+        for i in range(0, len(deleted), 1000):
+            location.records.filter(
+                index_file=index_file, filename__in=deleted[i:i + 1000]
+            ).delete()
+
+        old_index_file.delete()
+        update_location_statistics(location)
+        update_index_file_alignment(index_file)
+        update_alignment_index(collection, deleted)
 
     except Exception as exc:
         # move file to failed directory
-        os.rename(
-            join(pending_dir, index_file_name),
-            join(failed_dir, index_file_name)
-        )
+        os.rename(path, join(failed_dir, basename(path)))
         logger.error(
             "Failed to ingest index file %s for %s (%s). Error was: %s"
             % (index_file_name, collection, location.url, exc)
@@ -229,18 +1098,52 @@ def ingest(mission, file_type, url, index_file_name):
             % (index_file_name, collection, location.url, exc)
         )
     else:
-        # move file to ingested directory
-        os.rename(
-            join(pending_dir, index_file_name),
-            join(ingested_dir, index_file_name)
-        )
+        # move file to ingested directory and remove the replaced one
+        os.rename(path, join(ingested_dir, basename(path)))
+        os.remove(old_path)
         logger.info(
-            "Successfully ingested index file %s for %s (%s) with %d records"
-            % (index_file_name, collection, location.url, count)
+            "Successfully ingested index file %s replacing %s for %s (%s) "
+            "with %d records (%d inserted, %d updated, %d deleted) in %.3fs%s"
+            % (
+                index_file_name, old_index_file_name, collection,
+                location.url, count, num_inserted, num_updated, len(deleted),
+                timer.stop(),
+                " (%s)" % footprint_cache if footprint_cache else ""
+            )
         )
 
     return count
 
 
+# name of the temporary table to collect the changed rows of a diff ingestion
+DIFF_TABLE = "minv_ingest_diff"
+
+
+def _update_changed_records(cursor, old_index_file, fields):
+    """ Helper to update the records of the ``old_index_file`` with the
+    changed rows collected in the :data:`DIFF_TABLE` in a single statement,
+    matched by their filename. Returns the number of updated records.
+    """
+    meta = models.Record._meta
+    columns = [
+        meta.get_field(name).column for name in fields if name != "filename"
+    ]
+    if not columns:
+        return 0
+
+    # temporary tables are not analyzed automatically
+    cursor.execute("ANALYZE %s" % DIFF_TABLE)
+    cursor.execute("""
+        UPDATE %s AS record SET %s
+        FROM %s AS diff
+        WHERE record.index_file_id = %%s AND record.filename = diff.filename
+    """ % (
+        meta.db_table,
+        ", ".join("%s = diff.%s" % (column, column) for column in columns),
+        DIFF_TABLE
+    ), [old_index_file.pk])
+    return cursor.rowcount
+
+
 class IngestionError(Exception):
     pass
@@ -32,6 +32,8 @@ from django.core.management.base import BaseCommand, CommandError
 
 from minv.commands import CollectionCommand
 from minv.inventory import models
+from minv.inventory.statistics import update_location_statistics
+from minv.inventory.alignment import rebuild_alignment_index
 
 
 class Command(CollectionCommand):
@@ -75,6 +77,13 @@ class Command(CollectionCommand):
                     location, collection
                 )
                 location.index_files.all().delete()
+                update_location_statistics(location)
+                models.Collection.objects.filter(pk=collection.pk).update(
+                    alignment_indexed=False
+                )
+                # make sure the next harvest is not skipped
+                location.etag = location.last_modified = None
+                location.save()
                 print(
                     "Finished deleting all content for location %s on "
                     "collection %s" % (
@@ -87,3 +96,6 @@ class Command(CollectionCommand):
                 raise CommandError("No such location '%s' on collection %s" % (
                     url, collection
                 ))
+
+        print "Rebuilding the alignment index of collection %s" % collection
+        rebuild_alignment_index(collection)
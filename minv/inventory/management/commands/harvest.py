@@ -43,6 +43,11 @@ class Command(CollectionCommand):
             action="store_true", default=False,
             help="Harvest all locations from the collection."
         ),
+        make_option("-f", "--force", dest="force",
+            action="store_true", default=False,
+            help="Harvest the locations even when they were not modified "
+                 "since the last harvest."
+        ),
     )
 
     require_group = "minv_g_operators"
@@ -77,7 +82,7 @@ class Command(CollectionCommand):
                     "harvest",
                     mission=collection.mission,
                     file_type=collection.file_type,
-                    url=url
+                    url=url, force=options["force"]
                 )
                 if failed_retrieve or failed_ingest:
                     print(
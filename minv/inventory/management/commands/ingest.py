@@ -32,6 +32,7 @@ from django.core.management.base import BaseCommand, CommandError
 
 from minv.commands import CollectionCommand
 from minv.inventory.ingest import ingest
+from minv.utils import Timer
 
 
 class Command(CollectionCommand):
@@ -39,11 +40,35 @@ class Command(CollectionCommand):
         make_option("-u", "--url", dest="url",
             help="The associated harvesting location."
         ),
+        make_option("-e", "--engine", dest="engine", default=None,
+            choices=("bulk_create", "copy"),
+            help=(
+                "The ingestion engine to use. Either 'bulk_create' or 'copy'. "
+                "Defaults to the engine configured for the collection."
+            )
+        ),
+        make_option("-p", "--processes", dest="processes", default=None,
+            type="int",
+            help=(
+                "The number of processes to parse the index files with. "
+                "Defaults to the number configured for the collection."
+            )
+        ),
+        make_option("-c", "--checkpoint-interval", dest="checkpoint_interval",
+            default=None, type="int",
+            help=(
+                "Commit the records in batches of this many rows and resume "
+                "from the last checkpoint when the index file is ingested "
+                "again. Defaults to the interval configured for the "
+                "collection."
+            )
+        ),
     )
 
     require_group = "minv_g_operators"
 
-    args = 'MISSION/FILE-TYPE -u URL <index-file-name> ' \
+    args = 'MISSION/FILE-TYPE -u URL [-e ENGINE] [-p PROCESSES] ' \
+           '[-c CHECKPOINT-INTERVAL] <index-file-name> ' \
            '[<index-file-name> ...]'
 
     help = (
@@ -54,10 +79,15 @@ class Command(CollectionCommand):
     def handle_collection(self, collection, *args, **options):
         for index_file_name in args:
             try:
-                # TODO: print number of records ingested
-                ingest(
+                timer = Timer()
+                count = ingest(
                     collection.mission, collection.file_type, options["url"],
-                    index_file_name
+                    index_file_name, options["engine"], options["processes"],
+                    options["checkpoint_interval"]
+                )
+                self.info(
+                    "Ingested index file '%s' with %d records in %.3fs."
+                    % (index_file_name, count, timer.stop())
                 )
             except Exception as exc:
                 raise CommandError(
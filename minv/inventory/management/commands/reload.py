@@ -32,7 +32,6 @@ from optparse import make_option
 import tempfile
 import shutil
 import glob
-import csv
 
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
@@ -40,7 +39,12 @@ from django.db import transaction
 from minv.commands import CollectionCommand
 from minv.inventory import models
 from minv.inventory.ingest import ingest
-from minv.utils import safe_makedirs
+from minv.inventory.annotation import (
+    stash_annotations, restore_annotations
+)
+from minv.inventory.statistics import update_location_statistics
+from minv.inventory.alignment import rebuild_alignment_index
+from minv.utils import safe_makedirs, link_tree
 
 
 class Command(CollectionCommand):
@@ -93,35 +97,45 @@ class Command(CollectionCommand):
                     )
                 )
 
+        print "Rebuilding the alignment index"
+        rebuild_alignment_index(collection)
+
     @transaction.atomic
     def handle_location(self, collection, location):
-        tmp_dir = tempfile.mkdtemp()
-        shutil.copytree(collection.data_dir, join(tmp_dir, "backup"))
-        annotations_file = tempfile.TemporaryFile()
-
         ingested_dir = join(collection.data_dir, "ingested", location.slug)
         pending_dir = join(collection.data_dir, "pending", location.slug)
+        failed_dir = join(collection.data_dir, "failed", location.slug)
 
         safe_makedirs(ingested_dir)
         safe_makedirs(pending_dir)
+        safe_makedirs(failed_dir)
+
+        # back up only the directories of the location. The index files are
+        # only moved during the reload, so hard links suffice. The backup is
+        # kept in the data directory to be on the same file system.
+        location_dirs = {
+            "ingested": ingested_dir, "pending": pending_dir,
+            "failed": failed_dir
+        }
+        tmp_dir = tempfile.mkdtemp(prefix=".reload-", dir=collection.data_dir)
+        for name, path in location_dirs.items():
+            link_tree(path, join(tmp_dir, name))
 
         try:
             # move all files from ingested dir to pending dir
             for path in glob.iglob(join(ingested_dir, "*")):
                 os.rename(path, join(pending_dir, basename(path)))
 
-            # save all annotations to a CSV
-            writer = csv.writer(annotations_file, delimiter="\t")
-            writer.writerow(["filename", "annotation"])
-
-            for record in location.records.filter():
-                for annotation in record.annotations.all():
-                    writer.writerow([record.filename, annotation.text])
-
-            annotations_file.seek(0)
+            # stash all annotations in a temporary table
+            stash_annotations(location)
 
             # delete all index file records in database
             location.index_files.all().delete()
+            # the alignment index is rebuilt once all locations are reloaded
+            models.Collection.objects.filter(pk=collection.pk).update(
+                alignment_indexed=False
+            )
+            update_location_statistics(location)
 
             # re-ingest all index files in pending
             for path in glob.iglob(join(pending_dir, "*")):
@@ -130,19 +144,14 @@ class Command(CollectionCommand):
                     basename(path)
                 )
 
-            # restore annotations and remove temporary file
-            reader = csv.reader(annotations_file, delimiter="\t")
-            next(reader)  # skip header
-            for row in reader:
-                models.Annotation.objects.create(
-                    record=location.records.get(filename=row[0]),
-                    text=row[1]
-                )
+            # restore annotations from the temporary table
+            restore_annotations(location)
 
         except:
             # restore backups
-            shutil.rmtree(collection.data_dir)
-            shutil.move(join(tmp_dir, "backup"), collection.data_dir)
+            for name, path in location_dirs.items():
+                shutil.rmtree(path)
+                os.rename(join(tmp_dir, name), path)
             raise
         finally:
             shutil.rmtree(tmp_dir)
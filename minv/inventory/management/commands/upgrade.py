@@ -0,0 +1,120 @@
+# ------------------------------------------------------------------------------
+#
+# Project: Master Inventory <http://github.com/ESA-MInv/minv>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+# ------------------------------------------------------------------------------
+# Copyright (C) 2016 European Space Agency
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from minv.commands import MinvCommand
+from minv.inventory import models
+from minv.inventory.statistics import update_location_statistics
+from minv.inventory.alignment import rebuild_alignment_index
+
+
+# fields added to the models after their tables were created. ``syncdb`` only
+# creates new tables, so their columns have to be added explicitly.
+ADDED_FIELDS = (
+    (models.Collection, "alignment_indexed"),
+    (models.Location, "etag"),
+    (models.Location, "last_modified"),
+    (models.IndexFile, "complete"),
+    (models.IndexFile, "checkpoint_offset"),
+    (models.IndexFile, "checkpoint_count"),
+    (models.IndexFile, "failed_attempts"),
+)
+
+
+class Command(MinvCommand):
+
+    require_group = "minv_g_app_administrators"
+
+    args = ''
+
+    help = (
+        'Upgrade the database of an existing installation: add the missing '
+        'columns, create the missing tables and indexes and compute the '
+        'statistics and alignment indexes of all collections. '
+        'Requires membership of group "minv_g_app_administrators".'
+    )
+
+    def handle_authorized(self, *args, **options):
+        self.add_columns()
+
+        # create the new tables and the search indexes
+        call_command(
+            "syncdb", interactive=False, verbosity=int(self.verbosity)
+        )
+
+        for collection in models.Collection.objects.all():
+            print "Updating the statistics of collection %s" % collection
+            for location in collection.locations.all():
+                update_location_statistics(location)
+
+            print "Rebuilding the alignment index of collection %s" % (
+                collection
+            )
+            rebuild_alignment_index(collection)
+
+    @transaction.atomic
+    def add_columns(self):
+        """ Adds the columns of the :data:`ADDED_FIELDS` missing in existing
+        tables, along with their indexes. Columns of fields that are not
+        nullable are filled with the default of the field.
+        """
+        cursor = connection.cursor()
+        qn = connection.ops.quote_name
+        tables = connection.introspection.table_names(cursor)
+
+        for model, name in ADDED_FIELDS:
+            table = model._meta.db_table
+            field = model._meta.get_field(name)
+            # the table is created along with the column by ``syncdb``
+            if table not in tables:
+                continue
+
+            columns = [
+                column[0] for column in
+                connection.introspection.get_table_description(cursor, table)
+            ]
+            if field.column in columns:
+                continue
+
+            print "Adding column %s.%s" % (table, field.column)
+            sql = "ALTER TABLE %s ADD COLUMN %s %s" % (
+                qn(table), qn(field.column), field.db_type(connection)
+            )
+            if field.null:
+                cursor.execute(sql + " NULL")
+            else:
+                cursor.execute(sql + " NOT NULL DEFAULT %s", [
+                    field.get_db_prep_save(field.get_default(), connection)
+                ])
+
+            for index_sql in connection.creation.sql_indexes_for_field(
+                    model, field, no_style()):
+                cursor.execute(index_sql)
@@ -29,16 +29,19 @@
 from os import rmdir
 from shutil import rmtree
 from os.path import join, exists
+import json
 import logging
 
 from django.contrib.gis.db import models
-from django.db.models.signals import post_save, post_delete
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save, post_delete, post_syncdb
 from django.dispatch import receiver
 from django.conf import settings
 from django.utils.text import slugify
 from django.template.loader import render_to_string
 
 from minv.inventory.collection import config
+from minv.inventory.search_index import create_search_indexes
 from minv.utils import safe_makedirs, FileLock
 
 logger = logging.getLogger(__name__)
@@ -93,6 +96,10 @@ class Collection(models.Model):
     mission = models.CharField(max_length=512)
     file_type = models.CharField(max_length=512)
 
+    # whether the alignment index is complete and can be used for alignment
+    # checks
+    alignment_indexed = models.BooleanField(default=False)
+
     def __unicode__(self):
         return "%s/%s" % (self.mission, self.file_type)
 
@@ -105,6 +112,22 @@ class Collection(models.Model):
         )
         return mapping or self.configuration.default_metadata_mapping
 
+    def get_retrieve_concurrency(self, url):
+        """ Get the number of concurrent index file downloads for the location
+        with the given URL. It can be set for a single location in the
+        ``[location.<url>]`` section of the collection configuration.
+        """
+        if isinstance(url, Location):
+            url = url.url
+
+        configuration = self.configuration
+        value = configuration.get_section_dict("location.%s" % url).get(
+            "retrieve_concurrency"
+        )
+        if value:
+            return int(value)
+        return configuration.retrieve_concurrency
+
     @property
     def config_dir(self):
         return join(
@@ -147,6 +170,11 @@ class Location(models.Model):
     location_type = models.CharField(max_length=4,
                                      choices=(("oads", "OADS"), ("nga", "ngA")))
 
+    # validators of the listing of the last complete harvest, used for
+    # conditional scans
+    etag = models.CharField(max_length=256, null=True, blank=True)
+    last_modified = models.CharField(max_length=64, null=True, blank=True)
+
     class Meta:
         unique_together = (("collection", "url"),)
 
@@ -166,6 +194,13 @@ class IndexFile(models.Model):
     update_time = models.DateTimeField()
     insertion_time = models.DateTimeField(auto_now_add=True)
 
+    # state of checkpointed ingestions: records of incomplete index files are
+    # excluded from searches
+    complete = models.BooleanField(default=True, db_index=True)
+    checkpoint_offset = models.BigIntegerField(default=0)
+    checkpoint_count = models.IntegerField(default=0)
+    failed_attempts = models.IntegerField(default=0)
+
     class Meta:
         unique_together = (("filename", "location"),)
 
@@ -228,6 +263,78 @@ class Record(models.Model):
         return "%s (%s)" % (self.filename, self.location)
 
 
+class Statistics(models.Model):
+    """ Abstract base for the maintained statistics of the records of a
+    :class:`Location` or an :class:`IndexFile`.
+    """
+    count = models.BigIntegerField(default=0)
+    volume = models.BigIntegerField(null=True, blank=True)
+    begin_time_min = models.DateTimeField(null=True, blank=True)
+    begin_time_max = models.DateTimeField(null=True, blank=True)
+    end_time_min = models.DateTimeField(null=True, blank=True)
+    end_time_max = models.DateTimeField(null=True, blank=True)
+
+    # JSON object: the number of NULL values for each record field
+    null_counts = models.TextField(default="{}")
+
+    class Meta:
+        abstract = True
+
+    def get_null_counts(self):
+        return json.loads(self.null_counts)
+
+
+class LocationStatistics(Statistics):
+    location = models.OneToOneField("Location", related_name="statistics")
+
+    def __unicode__(self):
+        return "Statistics of %s" % self.location
+
+
+class IndexFileStatistics(Statistics):
+    index_file = models.OneToOneField("IndexFile", related_name="statistics")
+
+    def __unicode__(self):
+        return "Statistics of %s" % self.index_file
+
+
+class AlignmentEntry(models.Model):
+    """ Entry of the alignment index: the locations having a record with the
+    filename, the checksums of these records (in the same order) and whether
+    the filename is misaligned across the locations of the collection. The
+    location IDs and checksums are stored comma separated, a missing checksum
+    as an empty string. Use :meth:`get_location_checksums` to read them.
+    """
+    collection = models.ForeignKey(
+        "Collection", related_name="alignment_entries"
+    )
+    filename = models.CharField(max_length=256)
+    location_ids = models.TextField()
+    checksums = models.TextField()
+    misaligned = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = (("collection", "filename"),)
+        index_together = (("collection", "misaligned", "filename"),)
+
+    def __unicode__(self):
+        return "%s (%s)" % (self.filename, self.collection)
+
+    def get_location_checksums(self):
+        return split_alignment_entry(self.location_ids, self.checksums)
+
+
+def split_alignment_entry(location_ids, checksums):
+    """ Splits the comma separated location IDs and checksums of an
+    :class:`AlignmentEntry` into a list of location IDs and the list of the
+    corresponding checksums or ``None``.
+    """
+    return (
+        [int(location_id) for location_id in location_ids.split(",")],
+        [checksum or None for checksum in checksums.split(",")]
+    )
+
+
 class Annotation(models.Model):
     record = models.ForeignKey("Record", related_name="annotations")
     text = models.TextField()
@@ -252,6 +359,23 @@ def on_collection_created(sender, instance, created, **kwargs):
         safe_makedirs(instance.data_dir)
 
 
+@receiver(post_save)
+@receiver(post_delete)
+def on_location_changed(sender, instance, created=True, **kwargs):
+    # the alignment index depends on the set of locations of the collection
+    if sender is Location and created:
+        Collection.objects.filter(pk=instance.collection_id).update(
+            alignment_indexed=False
+        )
+
+
+@receiver(post_syncdb)
+def on_syncdb(sender, db=DEFAULT_DB_ALIAS, **kwargs):
+    # the sender is the models module of the synchronized app
+    if sender.__name__ == __name__:
+        create_search_indexes(Record, db)
+
+
 @receiver(post_delete)
 def on_collection_deleted(sender, instance, **kwargs):
     if sender is Collection:
@@ -28,13 +28,26 @@
 
 from datetime import datetime, timedelta
 from copy import deepcopy
+from uuid import uuid4
+from hashlib import md5
+import json
 
 from django.template.loader import render_to_string
-from django.db import connection
-from django.db.models import Min, Count
-from django.contrib.gis.geos import Polygon
+from django.core.paginator import (
+    Paginator, Page, EmptyPage, PageNotAnInteger
+)
+from django.utils.functional import cached_property
+from django.db import (
+    connection, connections, transaction, DEFAULT_DB_ALIAS
+)
+from django.db.models import Sum, Count, Q
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.geos import GEOSGeometry, Polygon
 
 from minv.inventory import models
+from minv.inventory.statistics import get_location_statistics
+from minv.inventory.search_index import filter_pattern
 
 
 def search(collection, filters=None, queryset=None, area_is_footprint=True):
@@ -51,10 +64,15 @@ def search(collection, filters=None, queryset=None, area_is_footprint=True):
     if queryset is not None:
         qs = queryset
     else:
-        models.Record.objects.filter(
+        qs = models.Record.objects.filter(
             location__collection=collection
         )
 
+    # exclude records of index files that are not completely ingested yet.
+    # The alignment check leaves them out by itself.
+    if not isinstance(qs, AlignmentQuerySet):
+        qs = qs.filter(index_file__complete=True)
+
     if filters:
         for key, value in filters.items():
 
@@ -110,13 +128,8 @@ def search(collection, filters=None, queryset=None, area_is_footprint=True):
 
             elif isinstance(value, basestring):
                 if "*" in value:
-                    start, _, end = value.partition("*")
+                    qs = filter_pattern(qs, key, value)
                     filter_ = {}
-
-                    if start:
-                        filter_["%s__startswith" % key] = start
-                    if end:
-                        filter_["%s__endswith" % key] = end
                 else:
                     filter_ = {key: value}
 
@@ -128,6 +141,528 @@ def search(collection, filters=None, queryset=None, area_is_footprint=True):
     return qs
 
 
+def has_filters(filters):
+    """ Returns whether any of the given search parameters would actually
+    filter the records.
+    """
+    return any(
+        value is not None and value != "" and value != []
+        for value in (filters or {}).values()
+    )
+
+
+def search_overview(collection, filters=None, locations=None,
+                    area_is_footprint=True):
+    """ Computes the number and the total volume of the :class:`Record`s
+    matching the given filters for each location in a single query grouped
+    by location.
+
+    :param collection: the collection to search on
+    :param filters: a dictionary of search parameters
+    :param locations: the locations to compute the overview for. By default
+                      all locations of the collection are used.
+
+    :returns: a list of 2-tuples: the :class:`Location` and a :class:`dict`
+              with the ``count`` and the ``volume`` of its records
+    """
+    if locations is None:
+        locations = collection.locations.order_by("pk")
+    locations = list(locations)
+
+    # without filters, the maintained statistics can be used
+    if not has_filters(filters):
+        statistics = get_location_statistics(locations)
+        if None not in statistics:
+            return [
+                (location, {
+                    "volume": location_statistics.volume,
+                    "count": location_statistics.count
+                })
+                for location, location_statistics in zip(
+                    locations, statistics
+                )
+            ]
+
+    qs = search(
+        collection, filters,
+        models.Record.objects.filter(location__in=locations),
+        area_is_footprint
+    )
+    values = dict(
+        (row["location"], row) for row in
+        qs.order_by().values("location").annotate(
+            volume=Sum("filesize"), count=Count("filename")
+        )
+    )
+
+    return [
+        (location, {
+            "volume": values.get(location.pk, {}).get("volume"),
+            "count": values.get(location.pk, {}).get("count", 0)
+        })
+        for location in locations
+    ]
+
+
+# the available modes to count search results
+COUNT_MODES = ("exact", "explain")
+
+# below this number of estimated rows, the exact count is used
+EXACT_COUNT_THRESHOLD = 10000
+
+
+class ResultCount(int):
+    """ The number of results of a query. The ``approximate`` flag tells
+    whether the number is an estimate.
+    """
+    def __new__(cls, value, approximate=False):
+        result = super(ResultCount, cls).__new__(cls, value)
+        result.approximate = approximate
+        return result
+
+
+def explain_rows(query, params=None):
+    """ Returns the planners estimate of the number of rows the given SQL
+    query returns, without actually executing it.
+    """
+    cursor = connection.cursor()
+    cursor.execute("EXPLAIN (FORMAT JSON) %s" % query, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, basestring):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimate_count(queryset):
+    """ Returns the planners estimate of the number of results of the given
+    :class:`QuerySet` or :class:`AlignmentQuerySet`.
+    """
+    if isinstance(queryset, AlignmentQuerySet):
+        if not queryset.locations:
+            return 0
+        query, params = queryset.sql()
+    else:
+        query, params = queryset.query.sql_with_params()
+    return explain_rows(query, params)
+
+
+def count_results(queryset, mode="exact",
+                  threshold=EXACT_COUNT_THRESHOLD):
+    """ Counts the results of the given :class:`QuerySet` or
+    :class:`AlignmentQuerySet` using the given mode:
+
+        * ``exact``: always run a ``COUNT(*)``
+        * ``explain``: use the row estimate of the query planner
+
+    Estimates below the ``threshold`` are replaced by the exact count.
+
+    :returns: the number of results
+    :rtype: :class:`ResultCount`
+    """
+    if mode not in COUNT_MODES:
+        raise ValueError("Invalid count mode %r." % mode)
+
+    if mode != "exact":
+        estimate = estimate_count(queryset)
+        if estimate >= threshold:
+            return ResultCount(estimate, True)
+
+    return ResultCount(queryset.count())
+
+
+class EstimatingPaginator(Paginator):
+    """ Django :class:`Paginator` using :func:`count_results` to determine
+    the total number of objects. As the count may be an estimate, pages
+    beyond the estimated number of pages are not rejected.
+    """
+
+    def __init__(self, object_list, per_page, count_mode="exact",
+                 count_threshold=EXACT_COUNT_THRESHOLD, **kwargs):
+        super(EstimatingPaginator, self).__init__(
+            object_list, per_page, **kwargs
+        )
+        self.count_mode = count_mode
+        self.count_threshold = count_threshold
+
+    @cached_property
+    def count(self):
+        return count_results(
+            self.object_list, self.count_mode, self.count_threshold
+        )
+
+    def validate_number(self, number):
+        if not self.count.approximate:
+            return super(EstimatingPaginator, self).validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        if not self.count.approximate:
+            return super(EstimatingPaginator, self).page(number)
+        # do not cap the page at the estimated count
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return Page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+
+class KeysetPaginator(object):
+    """ Paginator for :class:`Record` querysets that uses the sort field and
+    the primary key of the first and last records of a page as a cursor
+    instead of an ``OFFSET``. Thus navigating to adjacent pages costs the
+    same, regardless how deep the page is.
+
+    The interface mimicks Django's :class:`Paginator`. The total count is
+    determined by :func:`count_results` using the given ``count_mode``.
+
+    :param queryset: the (unordered) :class:`QuerySet` to paginate
+    :param per_page: the number of records per page
+    :param sort: the field to sort by, optionally prefixed with ``-``
+    :param count_mode: the mode to count the records with, see
+                       :func:`count_results`
+    :param count_threshold: the threshold below which records are counted
+                            exactly
+    :param search_key: identifies the search the queryset results from, see
+                       :func:`get_search_key`. Cursors of other searches are
+                       discarded.
+    """
+
+    def __init__(self, queryset, per_page, sort=None, count_mode="exact",
+                 count_threshold=EXACT_COUNT_THRESHOLD, search_key=None):
+        self.per_page = int(per_page)
+        self.search_key = search_key
+        self.sort = sort or None
+        self.descending = bool(sort and sort.startswith("-"))
+        self.field = sort.lstrip("-") if sort else None
+        self.queryset = queryset
+        self.count_mode = count_mode
+        self.count_threshold = count_threshold
+        self._min_pages = 1
+
+    @cached_property
+    def count(self):
+        """ Returns the (possibly estimated) number of records.
+        """
+        return count_results(
+            self.queryset, self.count_mode, self.count_threshold
+        )
+
+    @property
+    def num_pages(self):
+        pages = -(-self.count // self.per_page)
+        return max(pages, self._min_pages)
+
+    def page(self, number, cursor=None):
+        """ Returns the :class:`KeysetPage` for the given page number. When
+        the ``cursor`` of the currently displayed page is passed, the page is
+        located relative to it, otherwise an ``OFFSET`` has to be used.
+        A cursor of a different search, sorting or page size is discarded
+        and the first page is returned instead. Page numbers beyond the last
+        page are clamped to it, unless the count is an estimate.
+        """
+        number = max(int(number or 1), 1)
+        state = self._decode_cursor(cursor)
+        if cursor and state is None:
+            number = 1
+        if number > 1 and not self.count.approximate:
+            number = min(number, self.num_pages)
+        per_page = self.per_page
+
+        if number == 1:
+            records = list(self._ordered()[:per_page + 1])
+            has_next = len(records) > per_page
+            records = records[:per_page]
+
+        elif state is None:
+            offset = (number - 1) * per_page
+            records = list(self._ordered()[offset:offset + per_page + 1])
+            has_next = len(records) > per_page
+            records = records[:per_page]
+
+        else:
+            current, first, last = state
+            if number == current:
+                records = list(
+                    self._ordered().filter(
+                        self._after(first) | Q(pk=first[1])
+                    )[:per_page + 1]
+                )
+                has_next = len(records) > per_page
+                records = records[:per_page]
+
+            elif number > current and number >= self.num_pages and (
+                    number - current > 1):
+                # jump to the last page: read the records backwards
+                size = per_page
+                if not self.count.approximate:
+                    size = self.count - (number - 1) * per_page
+                records = list(self._ordered(True)[:size])
+                records.reverse()
+                has_next = False
+
+            elif number > current:
+                offset = (number - current - 1) * per_page
+                records = list(
+                    self._ordered().filter(
+                        self._after(last)
+                    )[offset:offset + per_page + 1]
+                )
+                has_next = len(records) > per_page
+                records = records[:per_page]
+
+            else:
+                offset = (current - number - 1) * per_page
+                records = list(
+                    self._ordered(True).filter(
+                        self._after(first, True)
+                    )[offset:offset + per_page]
+                )
+                records.reverse()
+                has_next = True
+
+        if has_next:
+            self._min_pages = max(self._min_pages, number + 1)
+        else:
+            self._min_pages = max(self._min_pages, number)
+
+        return KeysetPage(records, number, self, has_next)
+
+    def encode_cursor(self, number, records):
+        """ Encodes the cursor of the page with the given number and records.
+        """
+        if not records:
+            return ""
+        return json.dumps({
+            "page": number, "sort": self.sort, "per_page": self.per_page,
+            "search": self.search_key,
+            "first": self._key(records[0]), "last": self._key(records[-1])
+        }, default=lambda value: value.isoformat())
+
+    def _decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            state = json.loads(cursor)
+            if (state["sort"] != self.sort or
+                    state["per_page"] != self.per_page or
+                    state["search"] != self.search_key):
+                return None
+            return (
+                int(state["page"]),
+                self._parse_key(state["first"]),
+                self._parse_key(state["last"])
+            )
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def _key(self, record):
+        value = getattr(record, self.field) if self.field else None
+        return [value, record.pk]
+
+    def _parse_key(self, key):
+        value, pk = key
+        if self.field and value is not None:
+            value = self.queryset.model._meta.get_field(
+                self.field
+            ).to_python(value)
+        return value, int(pk)
+
+    def _ordered(self, reverse=False):
+        descending = self.descending != reverse
+        prefix = "-" if descending else ""
+        if self.field:
+            return self.queryset.order_by(
+                prefix + self.field, prefix + "pk"
+            )
+        return self.queryset.order_by(prefix + "pk")
+
+    def _after(self, key, reverse=False):
+        """ Returns a :class:`Q` object selecting the records following the
+        given key in the (possibly reversed) sort order. NULL values are
+        ordered last when ascending and first when descending, as PostgreSQL
+        does by default.
+        """
+        value, pk = key
+        descending = self.descending != reverse
+        op = "lt" if descending else "gt"
+        pk_after = Q(**{"pk__%s" % op: pk})
+
+        if not self.field:
+            return pk_after
+
+        field = self.field
+        if value is None:
+            q = Q(**{"%s__isnull" % field: True}) & pk_after
+            if descending:
+                q |= Q(**{"%s__isnull" % field: False})
+            return q
+
+        q = (
+            Q(**{"%s__%s" % (field, op): value}) |
+            (Q(**{field: value}) & pk_after)
+        )
+        if not descending:
+            q |= Q(**{"%s__isnull" % field: True})
+        return q
+
+
+class KeysetPage(object):
+    """ A single page of a :class:`KeysetPaginator`. Mimicks Django's
+    :class:`Page`.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+
+    @property
+    def cursor(self):
+        """ The cursor to be passed to :meth:`KeysetPaginator.page` to
+        navigate relative to this page.
+        """
+        return self.paginator.encode_cursor(self.number, self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def get_search_key(location, filters, area_is_footprint=True):
+    """ Returns a hash identifying the search with the given filters on the
+    records of the given :class:`Location`, e.g. to tell whether a
+    pagination cursor belongs to that search.
+    """
+    return md5(json.dumps(
+        [location.pk, filters, area_is_footprint], sort_keys=True,
+        default=unicode
+    )).hexdigest()
+
+
+def supports_keyset_pagination(sort):
+    """ Returns whether the results can be paginated by the given sort field
+    using the :class:`KeysetPaginator`. Geometry fields are not comparable.
+    """
+    if not sort:
+        return True
+    field = models.Record._meta.get_field(sort.lstrip("-"))
+    return not isinstance(field, GeometryField)
+
+
+# number of rows to fetch at once from server side cursors
+STREAM_BATCH_SIZE = 2000
+
+
+def get_stream_fields(model):
+    """ Returns the names of the concrete non-geometry fields of the given
+    model. These are the default columns read by :func:`stream_values`.
+    """
+    return [
+        field.name for field in model._meta.concrete_fields
+        if not isinstance(field, GeometryField)
+    ]
+
+
+def _is_geometry_field(model, name):
+    if name == "pk":
+        return False
+    return isinstance(model._meta.get_field(name), GeometryField)
+
+
+def stream_query(query, params=None, batch_size=STREAM_BATCH_SIZE,
+                 using=DEFAULT_DB_ALIAS):
+    """ Executes the given SQL query using a named (server side) PostgreSQL
+    cursor and yields the rows in lists of ``batch_size``. Only one batch is
+    held in memory at a time, regardless of the size of the result.
+
+    The cursor lives inside a transaction, which is kept open until the
+    generator is exhausted or closed.
+    """
+    with transaction.atomic(using=using):
+        cursor = connections[using].connection.cursor(
+            name="minv_stream_%s" % uuid4().hex
+        )
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+
+def stream_values(queryset, *fields, **kwargs):
+    """ Iterates over the rows of the given :class:`QuerySet` using a server
+    side cursor (see :func:`stream_query`). Instead of model instances, a
+    tuple with the values of the given fields is yielded for each row, or
+    the value itself when ``flat`` is set. The values are the same as with
+    ``values_list``. When no fields are given, all columns but the geometries
+    (``footprint`` and ``scene_centre``) are read.
+
+    :param batch_size: the number of rows to fetch at once
+    :param flat: whether to yield single values instead of tuples
+    """
+    flat = kwargs.pop("flat", False)
+    batch_size = kwargs.pop("batch_size", STREAM_BATCH_SIZE)
+    if kwargs:
+        raise TypeError("Unexpected keyword arguments %r." % kwargs.keys())
+    if flat and len(fields) != 1:
+        raise TypeError("'flat' requires exactly one field.")
+
+    fields = fields or get_stream_fields(queryset.model)
+    values_qs = queryset.values_list(*fields)
+    try:
+        query, params = values_qs.query.sql_with_params()
+    except EmptyResultSet:
+        return
+
+    # the rows are read from the raw cursor, so the geometries have to be
+    # converted from their database representation like values_list does
+    geometry_indices = [
+        i for i, name in enumerate(fields)
+        if _is_geometry_field(queryset.model, name)
+    ]
+    for rows in stream_query(query, params, batch_size, values_qs.db):
+        for row in rows:
+            if geometry_indices:
+                row = list(row)
+                for i in geometry_indices:
+                    if row[i] is not None:
+                        row[i] = GEOSGeometry(row[i])
+                row = tuple(row)
+            yield row[0] if flat else row
+
+
 def alignment(collection, filters=None):
     """ This function performs the alignment check on the specified
     :class:`Collection` with the given filters applied.
@@ -142,35 +677,85 @@ def alignment(collection, filters=None):
         locations_qs = locations_qs.filter(pk__in=filter_locations)
     locations = list(locations_qs)
 
-    qs = AlignmentQuerySet(locations)
+    # the alignment index can only be used when checking all locations
+    indexed = collection.alignment_indexed and (
+        not filter_locations or
+        len(locations) == collection.locations.count()
+    )
+
+    qs = AlignmentQuerySet(locations, collection if indexed else None)
     qs = search(collection, filters, qs)
 
     return locations, qs
 
 
+# number of alignment rows to fetch the annotations for at once
+ALIGNMENT_BATCH_SIZE = 1000
+
+
 class AlignmentQuerySet(object):
     """ Result set for alignment checking.
 
     The :class:`AlignmentQuerySet` is an object that mimicks Django's
     :class:`QuerySet` but only implements some of the necessary functions.
+
+    When the ``collection`` is passed, the misaligned filenames are read from
+    its alignment index (:class:`AlignmentEntry`), which is only valid when
+    all locations of the collection are checked. Otherwise they are computed
+    from the records.
     """
-    def __init__(self, locations):
+    # the model of the records the filters apply to
+    model = models.Record
+
+    def __init__(self, locations, collection=None):
         self._locations = locations
+        self._collection = collection
         self._filters = []
         self._length = None
         self._slice = None
 
-    def _make_query(self, count=False):
+    def _filtered_records(self):
         qs = models.Record.objects.filter(
-            location__in=self.locations
-        ).values("filename").annotate(
-            Min("checksum"), Count("annotations")
+            location__in=self._locations, index_file__complete=True
         )
+        for method, args, kwargs in self._filters:
+            qs = getattr(qs, method)(*args, **kwargs)
+        return qs
 
-        print self._locations, self._filters, self._length, self._slice
+    def _entries(self):
+        """ Returns the :class:`QuerySet` of the misaligned entries of the
+        alignment index.
+        """
+        qs = models.AlignmentEntry.objects.filter(
+            collection=self._collection, misaligned=True
+        )
+        # only when actually filtering, the filenames are restricted to the
+        # ones of the matching records
+        if self._filters:
+            qs = qs.filter(
+                filename__in=self._filtered_records().values("filename")
+            )
+        qs = qs.order_by("filename")
+        if self._slice:
+            qs = qs[self._slice]
+        return qs
+
+    def sql(self):
+        """ Returns the SQL query and its parameters to get the results.
+        """
+        if self._collection is not None:
+            return self._entries().query.sql_with_params()
+        return self._make_query()
 
-        for args, kwargs in self._filters:
-            qs = qs.filter(*args, **kwargs)
+    def _make_query(self, count=False):
+        # only when actually filtering, the filenames are restricted to the
+        # ones of the matching records
+        base_query = None
+        params = []
+        if self._filters:
+            base_query, params = self._filtered_records().values(
+                "filename"
+            ).query.sql_with_params()
 
         limit = None
         offset = None
@@ -178,7 +763,6 @@ class AlignmentQuerySet(object):
             limit = self._slice.stop - self._slice.start
             offset = self._slice.start if self._slice.start > 0 else None
 
-        base_query, params = qs._as_sql(connection)
         query = render_to_string("inventory/collection/alignment.sql", {
             "locations": self._locations, "base_query": base_query,
             "count": count, "limit": limit, "offset": offset
@@ -186,6 +770,22 @@ class AlignmentQuerySet(object):
 
         return query, params
 
+    def _get_annotations(self, filenames):
+        """ Fetches the annotations of the records with the given filenames on
+        the locations in a single query.
+        """
+        annotations = {}
+        if not filenames:
+            return annotations
+
+        qs = models.Annotation.objects.filter(
+            record__filename__in=filenames,
+            record__location__in=self._locations
+        ).order_by("pk").values_list("record__filename", "text")
+        for filename, text in qs:
+            annotations.setdefault(filename, []).append(text)
+        return annotations
+
     def __iter__(self):
         """ Executes the underlying query. Yields a :class:`dict` for each
         returned row having the following keys:
@@ -197,34 +797,65 @@ class AlignmentQuerySet(object):
               value indicating wether the location has such a record.
             * ``annotation_count``: the number of annotations for the records of
               that filename.
-            * ``annotations``: a :class:`QuerySet` with the actual annotations
+            * ``annotations``: a :class:`list` with the actual annotations
 
+        The annotations are fetched in bulk for each batch of rows.
         """
-        query, params = self._make_query()
-
-        location_count = len(self._locations)
-
-        cursor = connection.cursor()
-        cursor.execute(query, params)
-        for row in cursor:
-            checksums = row[3:3+location_count]
-
-            distinct_checksums = set([c for c in checksums if c is not None])
-            checksum_mismatch = False
-
-            if len(distinct_checksums) > 1:
-                checksum_mismatch = True
+        if not self._locations:
+            return
+
+        for rows in self._iter_batches():
+            # annotation counts are not known for entries of the alignment
+            # index
+            annotations = self._get_annotations([
+                row[0] for row in rows if row[3] is None or row[3]
+            ])
+
+            for filename, location_ids, checksums, annotation_count in rows:
+                if annotation_count is None:
+                    annotation_count = len(annotations.get(filename, []))
+
+                location_checksums = dict(zip(location_ids, checksums))
+                distinct_checksums = set(
+                    [c for c in checksums if c is not None]
+                )
+
+                yield {
+                    "filename": filename,
+                    "checksum_mismatch": len(distinct_checksums) > 1,
+                    "incidences": [
+                        (
+                            location_checksums.get(location.pk),
+                            location.pk in location_checksums
+                        )
+                        for location in self._locations
+                    ],
+                    "annotation_count": annotation_count,
+                    "annotations": annotations.get(filename, [])
+                }
 
-            yield {
-                "filename": row[0],
-                "checksum_mismatch": checksum_mismatch,
-                "incidences": zip(checksums, row[3+location_count:]),
-                "annotation_count": row[2],
-                "annotations": models.Annotation.objects.filter(
-                    record__filename=row[0], record__location__in=self._locations
-                ).values_list("text", flat=True)
-                if row[2] else models.Annotation.objects.none()
-            }
+    def _iter_batches(self):
+        """ Helper to yield the result rows in batches. Each row is a tuple
+        of the filename, the IDs of the locations having a record of that
+        filename, the checksums of these records and the number of their
+        annotations, if known.
+        """
+        if self._collection is not None:
+            query, params = self._entries().values_list(
+                "filename", "location_ids", "checksums"
+            ).query.sql_with_params()
+            for rows in stream_query(query, params, ALIGNMENT_BATCH_SIZE):
+                yield [
+                    (filename,) + models.split_alignment_entry(
+                        location_ids, checksums
+                    ) + (None,)
+                    for filename, location_ids, checksums in rows
+                ]
+
+        else:
+            query, params = self._make_query()
+            for rows in stream_query(query, params, ALIGNMENT_BATCH_SIZE):
+                yield rows
 
     @property
     def locations(self):
@@ -233,12 +864,23 @@ class AlignmentQuerySet(object):
         """
         return self._locations
 
+    def count(self):
+        """ Returns the exact number of results.
+        """
+        return len(self)
+
     def __len__(self):
         """ Returns the size of the underlying :class:`QuerySet`.
         """
         if self._slice:
             return self._slice.stop - self._slice.start
 
+        if self._length is None and not self._locations:
+            self._length = 0
+
+        if self._length is None and self._collection is not None:
+            self._length = self._entries().count()
+
         if self._length is None:
             query, params = self._make_query(True)
             cursor = connection.cursor()
@@ -263,6 +905,14 @@ class AlignmentQuerySet(object):
         :returns: self
         """
         other = deepcopy(self)
-        other._filters.append((args, kwargs))
+        other._filters.append(("filter", args, kwargs))
         # self._qs = self._qs.filter(*args, **kwargs)
         return other
+
+    def extra(self, *args, **kwargs):
+        """ Passes extra SQL conditions to the underlying :class:`QuerySet`.
+        :returns: self
+        """
+        other = deepcopy(self)
+        other._filters.append(("extra", args, kwargs))
+        return other
@@ -0,0 +1,144 @@
+# ------------------------------------------------------------------------------
+#
+# Project: Master Inventory <http://github.com/ESA-MInv/minv>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+# ------------------------------------------------------------------------------
+# Copyright (C) 2016 European Space Agency
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+import logging
+
+from django.db import (
+    connections, transaction, DEFAULT_DB_ALIAS, DatabaseError
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def escape_like(value):
+    """ Escapes the special characters of a SQL ``LIKE`` pattern.
+    """
+    return value.replace(
+        "\\", "\\\\"
+    ).replace("%", "\\%").replace("_", "\\_")
+
+
+def filter_pattern(queryset, field, pattern):
+    """ Filters the queryset by a search pattern with ``*`` wildcards for the
+    given field, using the condition that fits the available indexes:
+
+        * ``abc*``: ``startswith``, using the ``text_pattern_ops`` index
+        * ``*abc``: a prefix match of the reversed value, using the reverse
+          index
+        * ``abc*def``: both of the above
+        * everything else (e.g ``*abc*``): a ``LIKE`` pattern, using the
+          trigram index
+
+    The conditions the ORM cannot express are added via ``extra()``.
+    """
+    column = '"%s"."%s"' % (
+        queryset.model._meta.db_table,
+        queryset.model._meta.get_field(field).column
+    )
+    if pattern.count("*") == 1:
+        start, _, end = pattern.partition("*")
+        if start:
+            queryset = queryset.filter(**{"%s__startswith" % field: start})
+        if end:
+            queryset = queryset.extra(
+                where=["reverse(%s) LIKE %%s" % column],
+                params=[escape_like(end[::-1]) + "%"]
+            )
+        return queryset
+
+    return queryset.extra(
+        where=["%s LIKE %%s" % column],
+        params=["%".join(escape_like(part) for part in pattern.split("*"))]
+    )
+
+
+# the indexes to speed up the pattern searches on the filenames: name, index
+# method and indexed expression
+SEARCH_INDEXES = (
+    ("%s_filename_pattern", "btree", "filename text_pattern_ops"),
+    ("%s_filename_reverse", "btree", "reverse(filename) text_pattern_ops"),
+    ("%s_filename_trgm", "gin", "filename gin_trgm_ops"),
+)
+
+
+def create_search_indexes(model, using=DEFAULT_DB_ALIAS):
+    """ Creates the indexes for pattern searches on the filenames of the
+    table of the given model, unless they already exist. The trigram index
+    requires the ``pg_trgm`` extension, which is created if possible.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    cursor = connection.cursor()
+
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s",
+        [table]
+    )
+    existing = dict(cursor.fetchall())
+
+    for name, method, expression in SEARCH_INDEXES:
+        name = name % table
+        if name in existing:
+            continue
+
+        # Django already creates a "_like" index with varchar_pattern_ops for
+        # indexed char fields
+        if expression.startswith("filename ") and method == "btree" and any(
+                "(filename varchar_pattern_ops)" in definition
+                for definition in existing.values()):
+            continue
+
+        if method == "gin" and not _create_trigram_extension(connection):
+            logger.warning(
+                "Could not create the 'pg_trgm' extension, index %s is not "
+                "available." % name
+            )
+            continue
+
+        cursor.execute(
+            "CREATE INDEX %s ON %s USING %s (%s)"
+            % (name, table, method, expression)
+        )
+        logger.info("Created index %s." % name)
+
+
+def _create_trigram_extension(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    if cursor.fetchone():
+        return True
+
+    # creating the extension may require privileges, do not abort the
+    # surrounding transaction when it fails
+    try:
+        with transaction.atomic(using=connection.alias):
+            cursor.execute("CREATE EXTENSION pg_trgm")
+    except DatabaseError:
+        return False
+    return True
@@ -0,0 +1,168 @@
+# ------------------------------------------------------------------------------
+#
+# Project: Master Inventory <http://github.com/ESA-MInv/minv>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+# ------------------------------------------------------------------------------
+# Copyright (C) 2016 European Space Agency
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+import json
+
+from django.db import transaction
+from django.db.models import Count, Sum, Min, Max
+
+from minv.inventory import models
+
+
+TIME_FIELDS = ("begin_time", "end_time")
+
+
+def get_statistics_fields():
+    """ Returns the names of the :class:`Record` fields whose NULL values are
+    counted.
+    """
+    return [
+        field.name for field in models.Record._meta.fields
+        if field.name not in ("id", "location", "index_file", "filename")
+    ]
+
+
+def _merge(statistics, other):
+    """ Helper to add the ``other`` statistics to the given ones.
+    """
+    statistics.count += other.count
+    if other.volume is not None:
+        statistics.volume = (statistics.volume or 0) + other.volume
+
+    for field in TIME_FIELDS:
+        for key, func in (("%s_min" % field, min), ("%s_max" % field, max)):
+            candidates = [
+                value for value in (
+                    getattr(statistics, key), getattr(other, key)
+                ) if value is not None
+            ]
+            setattr(statistics, key, func(candidates) if candidates else None)
+
+    merged = statistics.get_null_counts()
+    for field, nulls in other.get_null_counts().items():
+        merged[field] = merged.get(field, 0) + nulls
+    statistics.null_counts = json.dumps(merged, sort_keys=True)
+
+
+@transaction.atomic
+def update_index_file_statistics(index_file):
+    """ Computes the statistics of the records of the given
+    :class:`IndexFile` in a single query and stores them.
+
+    :returns: the statistics
+    :rtype: :class:`IndexFileStatistics`
+    """
+    fields = get_statistics_fields()
+    aggregates = {"count": Count("pk"), "volume": Sum("filesize")}
+    for field in TIME_FIELDS:
+        aggregates["%s_min" % field] = Min(field)
+        aggregates["%s_max" % field] = Max(field)
+    for field in fields:
+        aggregates["%s__count" % field] = Count(field)
+
+    values = models.Record.objects.filter(
+        index_file=index_file
+    ).aggregate(**aggregates)
+
+    null_counts = dict(
+        (field, values["count"] - values.pop("%s__count" % field))
+        for field in fields
+    )
+    values["null_counts"] = json.dumps(null_counts, sort_keys=True)
+
+    statistics, _ = models.IndexFileStatistics.objects.select_for_update(
+    ).get_or_create(index_file=index_file)
+    for name, value in values.items():
+        setattr(statistics, name, value)
+    statistics.save()
+    return statistics
+
+
+@transaction.atomic
+def update_location_statistics(location):
+    """ Recomputes the statistics of the given :class:`Location` from the
+    statistics of its completely ingested index files. Statistics of index
+    files that are missing, e.g. as they were ingested before, are computed
+    first.
+
+    :returns: the statistics
+    :rtype: :class:`LocationStatistics`
+    """
+    index_files = location.index_files.filter(complete=True)
+    for index_file in index_files.filter(statistics__isnull=True):
+        update_index_file_statistics(index_file)
+
+    statistics, _ = models.LocationStatistics.objects.select_for_update(
+    ).get_or_create(location=location)
+
+    statistics.count = 0
+    statistics.volume = None
+    for field in TIME_FIELDS:
+        setattr(statistics, "%s_min" % field, None)
+        setattr(statistics, "%s_max" % field, None)
+    statistics.null_counts = "{}"
+
+    qs = models.IndexFileStatistics.objects.filter(
+        index_file__in=index_files
+    )
+    for index_file_statistics in qs:
+        _merge(statistics, index_file_statistics)
+    statistics.save()
+    return statistics
+
+
+@transaction.atomic
+def add_index_file_statistics(index_file):
+    """ Computes the statistics of a newly ingested :class:`IndexFile` and
+    adds them to the statistics of its :class:`Location`.
+    """
+    location = index_file.location
+    try:
+        statistics = models.LocationStatistics.objects.select_for_update(
+        ).get(location=location)
+    except models.LocationStatistics.DoesNotExist:
+        # initially compute the location statistics from all index files
+        return update_location_statistics(location)
+
+    _merge(statistics, update_index_file_statistics(index_file))
+    statistics.save()
+    return statistics
+
+
+def get_location_statistics(locations):
+    """ Returns the :class:`LocationStatistics` for each of the given
+    locations or ``None`` when the statistics of a location were not yet
+    computed.
+    """
+    statistics = dict(
+        (statistics.location_id, statistics)
+        for statistics in models.LocationStatistics.objects.filter(
+            location__in=locations
+        )
+    )
+    return [statistics.get(location.pk) for location in locations]
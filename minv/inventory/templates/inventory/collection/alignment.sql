@@ -1,42 +1,44 @@
+{% if count %}
+SELECT COUNT(*) AS count FROM (
+{% endif %}
 SELECT
-  {% if not count %}
-    base.filename AS filename, 
-    base.checksum__min AS checksum,
-    base.annotations__count AS annotation_count,
-
-    {% for location in locations %}
-    l{{ location.pk }}.checksum AS l{{ location.pk }}c,
-    {% endfor %}
-
-    {% for location in locations %}
-    l{{ location.pk }}.filename IS NOT NULL{% if not forloop.last %},{% endif %}
-    {% endfor %}
-  {% else %}
-    COUNT(*) AS count
+  record.filename AS filename
+  {% if not count %},
+  array_agg(record.location_id) AS location_ids,
+  array_agg(record.checksum) AS checksums,
+  COALESCE(SUM(annotation.annotation_count), 0) AS annotation_count
   {% endif %}
-FROM
-  (
-    {{ base_query|safe }}
-  ) AS base
-{% for location in locations %}
+FROM inventory_record AS record
+JOIN inventory_indexfile AS index_file
+  ON index_file.id = record.index_file_id AND index_file.complete
+{% if not count %}
 LEFT JOIN
-    (
-      SELECT filename, checksum
-      FROM inventory_record
-      WHERE inventory_record.location_id = {{ location.pk }}
-    ) AS l{{ location.pk }}
-    ON base.filename = l{{ location.pk }}.filename
-{% endfor %}
+  (
+    SELECT record_id, COUNT(*) AS annotation_count
+    FROM inventory_annotation
+    GROUP BY record_id
+  ) AS annotation
+  ON annotation.record_id = record.id
+{% endif %}
 WHERE
-{% for location in locations %}
-    {% if not forloop.first %}OR {% endif %}
-    l{{ location.pk }}.filename IS NULL
-    OR l{{ location.pk }}.checksum != base.checksum__min
-{% endfor %}
-{% if not count %}ORDER BY base.filename{% endif %}
+  record.location_id IN ({% for location in locations %}{{ location.pk }}{% if not forloop.last %}, {% endif %}{% endfor %})
+{% if base_query %}
+  AND record.filename IN (
+    {{ base_query|safe }}
+  )
+{% endif %}
+GROUP BY record.filename
+HAVING
+  COUNT(*) < {{ locations|length }}
+  OR COUNT(DISTINCT record.checksum) > 1
+{% if count %}
+) AS alignment
+{% else %}
+ORDER BY record.filename
 {% if limit %}
 LIMIT {{ limit }}
 {% endif %}
 {% if offset %}
 OFFSET {{ offset }}
 {% endif %}
+{% endif %}
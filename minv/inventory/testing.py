@@ -0,0 +1,142 @@
+# ------------------------------------------------------------------------------
+#
+# Project: Master Inventory <http://github.com/ESA-MInv/minv>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+# ------------------------------------------------------------------------------
+# Copyright (C) 2016 European Space Agency
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+from tempfile import mkdtemp
+from os.path import join
+import shutil
+
+from django.conf import settings
+
+from minv.inventory import models
+from minv.inventory.ingest import ingest
+from minv.utils import safe_makedirs
+
+
+class InventoryMixIn(object):
+    """ Mix-in to use temporary configuration and data directories and to
+    load the test data.
+    """
+    def setUp(self):
+        try:
+            super(InventoryMixIn, self).setUp()
+            self.install_temporary()
+            self.load_data()
+        except:
+            self.destroy_temporary()
+            raise
+
+    def tearDown(self):
+        super(InventoryMixIn, self).tearDown()
+        self.destroy_temporary()
+
+    def load_data(self):
+        pass
+
+    def install_temporary(self):
+        settings.MINV_CONFIG_DIR = mkdtemp()
+        settings.MINV_DATA_DIR = mkdtemp()
+
+    def destroy_temporary(self):
+        shutil.rmtree(settings.MINV_CONFIG_DIR)
+        shutil.rmtree(settings.MINV_DATA_DIR)
+
+
+class IngestMixIn(InventoryMixIn):
+    """ Mix-in to set up a collection with a single location and a metadata
+    mapping to ingest generated index files. When ``num_rows`` is set, an
+    index file with that many rows is ingested right away.
+    """
+
+    index_file_name = "20160101-000000_20160102-000000_20160103-000000.index"
+    url = "http://test.com"
+    num_rows = None
+
+    mapping = (
+        ("filename", "productURI"),
+        ("filesize", "productSize"),
+        ("checksum", "checksum"),
+        ("orbit_number", "orbitNumber"),
+        ("begin_time", "beginAcquisition"),
+        ("orbit_direction", "orbitDirection"),
+        ("product_quality_degradatation", "productQualityDegredation"),
+        ("footprint", "footprint"),
+    )
+
+    def load_data(self):
+        self.collection = models.Collection.objects.create(
+            mission="Landsat5", file_type="SIP-SCENE"
+        )
+        self.location = models.Location.objects.create(
+            collection=self.collection, url=self.url, location_type="oads"
+        )
+        config = self.collection.configuration
+        config.default_metadata_mapping = dict(self.mapping)
+        config.write()
+
+        if self.num_rows:
+            self.write_index_file(self.num_rows)
+            self.ingest("copy")
+
+    def get_dir(self, name):
+        """ Returns the path of the ``pending``, ``ingested`` or ``failed``
+        directory of the location.
+        """
+        return join(self.collection.data_dir, name, self.location.slug)
+
+    def write_index_file(self, num_rows, index_file_name=None, rows=None):
+        """ Writes an index file with generated rows to the pending directory.
+        The values of each row are derived from its number. Returns the path
+        of the index file.
+        """
+        pending_dir = self.get_dir("pending")
+        safe_makedirs(pending_dir)
+        path = join(pending_dir, index_file_name or self.index_file_name)
+        with open(path, "w") as f:
+            f.write("\t".join(source for _, source in self.mapping) + "\n")
+            for i in rows if rows is not None else range(num_rows):
+                f.write("\t".join([
+                    "http://test.com/data/file_%d.zip" % i,
+                    str(i * 1024),
+                    "c%d" % i,
+                    str(i),
+                    "2016-01-01T00:00:%02dZ" % (i % 60),
+                    "ASCENDING" if i % 2 else "",
+                    "%f" % (i / 3.0),
+                    "10 %d 10 %d 20 %d 20 %d 10 %d" % (
+                        i % 170, i % 170 + 1, i % 170 + 1, i % 170, i % 170
+                    ),
+                ]) + "\n")
+        return path
+
+    def ingest(self, engine, index_file_name=None, processes=None,
+               checkpoint_interval=None):
+        return ingest(
+            self.collection.mission, self.collection.file_type, self.url,
+            index_file_name or self.index_file_name, engine, processes,
+            checkpoint_interval
+        )
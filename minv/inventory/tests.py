@@ -26,40 +26,45 @@
 # ------------------------------------------------------------------------------
 
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.db import connection, transaction, OperationalError
+from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
 from django.utils.timezone import now
-from django.conf import settings
-from tempfile import mkdtemp
+from django.contrib.gis.geos import GEOSGeometry
+import os
+from os.path import join, exists
 import shutil
+import zipfile
+import csv
+from StringIO import StringIO
 
 from minv.inventory import models
 from minv.inventory import queries
-
-
-class InventoryMixIn(object):
-    def setUp(self):
-        try:
-            super(InventoryMixIn, self).setUp()
-            self.install_temporary()
-            self.load_data()
-        except:
-            self.destroy_temporary()
-            raise
-
-    def tearDown(self):
-        super(InventoryMixIn, self).tearDown()
-        self.destroy_temporary()
-
-    def load_data(self):
-        pass
-
-    def install_temporary(self):
-        settings.MINV_CONFIG_DIR = mkdtemp()
-        settings.MINV_DATA_DIR = mkdtemp()
-
-    def destroy_temporary(self):
-        shutil.rmtree(settings.MINV_CONFIG_DIR)
-        shutil.rmtree(settings.MINV_DATA_DIR)
+from minv.inventory.testing import InventoryMixIn, IngestMixIn
+from minv.inventory import ingest as ingest_module
+from minv.inventory.ingest import (
+    ingest_diff, iter_chunks, RowConverter, IngestionError, FootprintCache,
+    parse_footprint
+)
+from minv.inventory.statistics import update_location_statistics
+from minv.inventory.collection.views import iter_csv
+from minv.inventory.management.commands.reload import (
+    Command as ReloadCommand
+)
+from minv.inventory.management.commands.upgrade import (
+    Command as UpgradeCommand
+)
+from minv.inventory.alignment import (
+    rebuild_alignment_index, update_alignment_index,
+    update_index_file_alignment, stash_alignment_filenames,
+    update_stashed_alignment
+)
+from minv.inventory.annotation import (
+    annotate, annotate_filenames, stash_annotations, restore_annotations
+)
+from minv.geom_utils import fix_footprint, fix_footprints
 
 
 class AlignmentTestCase(InventoryMixIn, TestCase):
@@ -121,9 +126,873 @@ class AlignmentTestCase(InventoryMixIn, TestCase):
         )
 
     def test_simple(self):
-        results = queries.alignment(
+        locations, results = queries.alignment(
             models.Collection.objects.get(
                 mission="Landsat5", file_type="SIP-SCENE"
             )
         )
-        print results
+        self.assertEqual(len(results), 2)
+        rows = list(results)
+        self.assertEqual([row["filename"] for row in rows], ["B", "C"])
+        self.assertEqual(
+            rows[0]["incidences"],
+            [("A", True), ("A", True), (None, False), (None, False)]
+        )
+        self.assertFalse(rows[0]["checksum_mismatch"])
+
+    def test_checksum_mismatch(self):
+        record = models.Record.objects.get(
+            filename="A", location__url="http://test_3.com"
+        )
+        record.checksum = "X"
+        record.save()
+        models.Annotation.objects.create(record=record, text="mismatch")
+
+        locations, results = queries.alignment(
+            models.Collection.objects.get(
+                mission="Landsat5", file_type="SIP-SCENE"
+            ),
+            {"filesize": [1, 1]}
+        )
+        rows = list(results)
+        self.assertEqual([row["filename"] for row in rows], ["A", "B", "C"])
+        self.assertTrue(rows[0]["checksum_mismatch"])
+        self.assertEqual(rows[0]["annotation_count"], 1)
+        self.assertEqual(rows[0]["annotations"], ["mismatch"])
+
+    def test_filename_pattern(self):
+        collection = models.Collection.objects.get(
+            mission="Landsat5", file_type="SIP-SCENE"
+        )
+        for indexed in (False, True):
+            if indexed:
+                rebuild_alignment_index(collection)
+            for pattern in ("*B", "*B*"):
+                _, results = queries.alignment(
+                    collection, {"filename": pattern}
+                )
+                self.assertEqual(
+                    [row["filename"] for row in results], ["B"]
+                )
+
+    def test_alignment_index(self):
+        collection = models.Collection.objects.get(
+            mission="Landsat5", file_type="SIP-SCENE"
+        )
+        location_ids = sorted(
+            collection.locations.values_list("pk", flat=True)
+        )
+        models.Record.objects.filter(
+            filename="C", location=location_ids[3]
+        ).update(checksum=None)
+        _, expected = queries.alignment(collection)
+        expected = list(expected)
+
+        rebuild_alignment_index(collection)
+        _, results = queries.alignment(collection)
+        self.assertIsNotNone(results._collection)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(list(results), expected)
+
+        # the locations and checksums are kept in the same order, including
+        # missing checksums
+        entry = collection.alignment_entries.get(filename="C")
+        self.assertEqual(
+            entry.get_location_checksums(), (location_ids[2:], ["C", None])
+        )
+
+        # record B is added to the remaining locations
+        index_files = models.IndexFile.objects.filter(
+            location__url__in=["http://test_2.com", "http://test_3.com"]
+        )
+        for index_file in index_files:
+            models.Record.objects.create(
+                location=index_file.location, index_file=index_file,
+                filename="B", checksum="A", filesize=1
+            )
+        update_alignment_index(collection, ["B"])
+        _, results = queries.alignment(collection)
+        self.assertEqual([row["filename"] for row in results], ["C"])
+
+        # adding a location invalidates the alignment index
+        models.Location.objects.create(
+            collection=collection, url="http://test_4.com",
+            location_type="oads"
+        )
+        collection = models.Collection.objects.get(pk=collection.pk)
+        self.assertFalse(collection.alignment_indexed)
+
+    def test_alignment_index_updates(self):
+        collection = models.Collection.objects.get(
+            mission="Landsat5", file_type="SIP-SCENE"
+        )
+        locations = list(collection.locations.order_by("pk"))
+        rebuild_alignment_index(collection)
+
+        def check(filenames):
+            _, results = queries.alignment(collection)
+            self.assertIsNotNone(results._collection)
+            live = queries.search(
+                collection, None, queries.AlignmentQuerySet(locations)
+            )
+            self.assertEqual(list(results), list(live))
+            self.assertEqual([row["filename"] for row in results], filenames)
+
+        # the records of incompletely ingested index files are left out
+        index_file = models.IndexFile.objects.get(location=locations[3])
+        index_file.complete = False
+        index_file.save()
+        update_index_file_alignment(index_file)
+        check(["A", "B", "C"])
+
+        index_file.complete = True
+        index_file.save()
+        update_index_file_alignment(index_file)
+        check(["B", "C"])
+
+        # the entries of deleted records are updated
+        stash_alignment_filenames(
+            collection, models.Record.objects.filter(location=locations[2])
+        )
+        models.IndexFile.objects.filter(location=locations[2]).delete()
+        update_stashed_alignment(collection)
+        check(["A", "B", "C"])
+
+
+class IngestEngineTestCase(IngestMixIn, TestCase):
+    def record_values(self):
+        return list(
+            self.location.records.order_by("filename").values_list(
+                "filename", "filesize", "checksum", "orbit_number",
+                "begin_time", "orbit_direction",
+                "product_quality_degradatation", "footprint"
+            )
+        )
+
+    def reset(self):
+        self.location.index_files.all().delete()
+        shutil.move(
+            join(self.get_dir("ingested"), self.index_file_name),
+            join(self.get_dir("pending"), self.index_file_name)
+        )
+
+    def test_engines_equivalent(self):
+        self.write_index_file(100)
+        self.assertEqual(self.ingest("bulk_create"), 100)
+        bulk_create_values = self.record_values()
+
+        self.reset()
+        self.assertEqual(self.ingest("copy"), 100)
+        self.assertEqual(bulk_create_values, self.record_values())
+
+    def test_parallel(self):
+        self.write_index_file(100)
+        self.assertEqual(self.ingest("copy"), 100)
+        values = self.record_values()
+
+        self.reset()
+        self.assertEqual(self.ingest("copy", processes=4), 100)
+        self.assertEqual(values, self.record_values())
+
+    def test_parallel_chunks(self):
+        # the rows of a byte range parsed by a worker are loaded in chunks
+        path = self.write_index_file(100)
+        converter = RowConverter(self.mapping)
+        with open(path) as f:
+            header = next(csv.reader([f.readline()], delimiter="\t"))
+            chunks = list(iter_chunks(
+                f, converter.bind_many(header, self.index_file_name), path,
+                self.mapping, header, self.index_file_name, processes=2,
+                chunk_size=7
+            ))
+
+        self.assertEqual(sum(len(rows) for rows, _ in chunks), 100)
+        self.assertTrue(all(len(rows) <= 7 for rows, _ in chunks))
+        self.assertEqual(chunks[-1][1], os.path.getsize(path))
+
+    def test_blank_lines(self):
+        # blank lines, e.g. a trailing one, are skipped
+        with open(self.write_index_file(10), "a") as f:
+            f.write("\n")
+        self.assertEqual(self.ingest("copy"), 10)
+
+        self.reset()
+        self.assertEqual(self.ingest("copy", processes=4), 10)
+
+        updated_index_file_name = (
+            "20160101-000000_20160102-000000_20160104-000000.index"
+        )
+        with open(self.write_index_file(11, updated_index_file_name),
+                  "a") as f:
+            f.write("\n")
+        self.assertEqual(
+            ingest_diff(
+                self.collection.mission, self.collection.file_type, self.url,
+                self.index_file_name, updated_index_file_name, "copy"
+            ), 11
+        )
+
+    def test_zipped(self):
+        self.write_index_file(100)
+        self.assertEqual(self.ingest("copy"), 100)
+        values = self.record_values()
+
+        self.location.index_files.all().delete()
+        path = join(self.get_dir("ingested"), self.index_file_name)
+        with zipfile.ZipFile(join(self.get_dir("pending"),
+                                  self.index_file_name + ".zip"),
+                             "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.write(path, self.index_file_name)
+        os.remove(path)
+
+        self.assertEqual(self.ingest("copy"), 100)
+        self.assertEqual(values, self.record_values())
+        self.assertEqual(
+            self.location.index_files.get().filename, self.index_file_name
+        )
+        self.assertTrue(exists(path + ".zip"))
+
+
+class InterruptedLoader(ingest_module.CopyLoader):
+    """ Loader failing with a transient error once more than ``limit`` rows
+    would be loaded.
+    """
+    limit = None
+
+    def load(self, rows):
+        if InterruptedLoader.limit is not None:
+            if len(rows) > InterruptedLoader.limit:
+                raise OperationalError("connection lost")
+            InterruptedLoader.limit -= len(rows)
+        super(InterruptedLoader, self).load(rows)
+
+
+class CheckpointedIngestTestCase(IngestMixIn, TransactionTestCase):
+    # checkpoints are committed, so they cannot be tested within a transaction
+
+    def setUp(self):
+        super(CheckpointedIngestTestCase, self).setUp()
+        # checkpoints are only reached after whole chunks
+        self.chunk_size = ingest_module.CHUNK_SIZE
+        ingest_module.CHUNK_SIZE = 10
+        ingest_module.INGEST_ENGINES["interrupted"] = InterruptedLoader
+
+    def tearDown(self):
+        ingest_module.CHUNK_SIZE = self.chunk_size
+        del ingest_module.INGEST_ENGINES["interrupted"]
+        InterruptedLoader.limit = None
+        super(CheckpointedIngestTestCase, self).tearDown()
+
+    def assertFailed(self, path):
+        self.assertFalse(exists(path))
+        self.assertTrue(
+            exists(join(self.get_dir("failed"), os.path.basename(path)))
+        )
+        self.assertFalse(self.location.index_files.exists())
+        self.assertEqual(self.location.records.count(), 0)
+
+    def test_resume(self):
+        # the ingestion is cut off by a lost connection after row 45
+        path = self.write_index_file(100)
+        InterruptedLoader.limit = 45
+
+        with self.assertRaises(IngestionError):
+            self.ingest("interrupted", checkpoint_interval=20)
+
+        index_file = self.location.index_files.get()
+        self.assertFalse(index_file.complete)
+        self.assertEqual(index_file.checkpoint_count, 40)
+        self.assertEqual(index_file.failed_attempts, 1)
+        self.assertEqual(self.location.records.count(), 40)
+        # the records of the incomplete index file are not found
+        self.assertEqual(queries.search(self.collection).count(), 0)
+        self.assertTrue(exists(path))
+
+        # the ingestion is resumed from the last checkpoint
+        InterruptedLoader.limit = None
+        self.assertEqual(
+            self.ingest("interrupted", checkpoint_interval=20), 100
+        )
+
+        index_file = self.location.index_files.get()
+        self.assertTrue(index_file.complete)
+        self.assertEqual(index_file.checkpoint_count, 100)
+        self.assertEqual(queries.search(self.collection).count(), 100)
+        self.assertEqual(
+            self.location.records.values("filename").distinct().count(), 100
+        )
+
+    def test_max_attempts(self):
+        path = self.write_index_file(100)
+        InterruptedLoader.limit = 45
+        with self.assertRaises(IngestionError):
+            self.ingest("interrupted", checkpoint_interval=20)
+
+        # the resumed ingestion fails again, up to three attempts in total
+        InterruptedLoader.limit = 0
+        with self.assertRaises(IngestionError):
+            self.ingest("interrupted", checkpoint_interval=20)
+        self.assertEqual(self.location.index_files.get().failed_attempts, 2)
+        self.assertTrue(exists(path))
+
+        with self.assertRaises(IngestionError):
+            self.ingest("interrupted", checkpoint_interval=20)
+        self.assertFailed(path)
+
+    def test_fail_before_checkpoint(self):
+        # transient errors before the first checkpoint are not resumed
+        path = self.write_index_file(100)
+        InterruptedLoader.limit = 5
+        with self.assertRaises(IngestionError):
+            self.ingest("interrupted", checkpoint_interval=20)
+        self.assertFailed(path)
+
+    def test_fail_invalid_row(self):
+        # the ingestion of an invalid value in row 55 would fail again
+        path = self.write_index_file(100)
+        with open(path) as f:
+            content = f.read()
+        with open(path, "w") as f:
+            f.write(content.replace("\t55\t", "\tinvalid\t"))
+
+        with self.assertRaises(IngestionError):
+            self.ingest("copy", checkpoint_interval=20)
+        self.assertFailed(path)
+
+    def test_no_checkpoints_in_transaction(self):
+        # within a transaction, the index file is ingested all at once
+        path = self.write_index_file(100)
+        InterruptedLoader.limit = 45
+        with self.assertRaises(IngestionError):
+            with transaction.atomic():
+                self.ingest("interrupted", checkpoint_interval=20)
+        self.assertFailed(path)
+
+
+class DiffIngestTestCase(IngestMixIn, TestCase):
+    updated_index_file_name = (
+        "20160101-000000_20160102-000000_20160104-000000.index"
+    )
+
+    def test_diff_ingest(self):
+        self.write_index_file(10)
+        self.ingest("copy")
+        kept = self.location.records.get(filename="file_1.zip")
+        models.Annotation.objects.create(record=kept, text="kept")
+        models.Annotation.objects.create(
+            record=self.location.records.get(filename="file_2.zip"),
+            text="deleted"
+        )
+
+        # file 2 is removed, file 10 is added
+        path = self.write_index_file(
+            None, self.updated_index_file_name,
+            [0, 1] + range(3, 11)
+        )
+        # alter the size of file 3
+        with open(path) as f:
+            content = f.read()
+        with open(path, "w") as f:
+            f.write(content.replace("\t3072\t", "\t1\t"))
+
+        count = ingest_diff(
+            self.collection.mission, self.collection.file_type, self.url,
+            self.index_file_name, self.updated_index_file_name, "copy"
+        )
+        self.assertEqual(count, 10)
+
+        index_file = self.location.index_files.get()
+        self.assertEqual(index_file.filename, self.updated_index_file_name)
+        self.assertEqual(
+            sorted(
+                index_file.record_set.values_list("filename", flat=True)
+            ),
+            sorted(["file_%d.zip" % i for i in [0, 1] + range(3, 11)])
+        )
+        self.assertEqual(
+            self.location.records.get(filename="file_3.zip").filesize, 1
+        )
+        self.assertEqual(
+            self.location.records.get(filename="file_1.zip").pk, kept.pk
+        )
+        self.assertEqual(
+            list(models.Annotation.objects.values_list("text", flat=True)),
+            ["kept"]
+        )
+
+    def test_diff_ingest_scope(self):
+        # another index file lists file 3, too
+        other_index_file_name = (
+            "20160101-000000_20160102-000000_20160102-120000.index"
+        )
+        self.write_index_file(4, other_index_file_name)
+        self.ingest("copy", other_index_file_name)
+        self.write_index_file(10)
+        self.ingest("copy")
+
+        path = self.write_index_file(10, self.updated_index_file_name)
+        with open(path) as f:
+            content = f.read()
+        with open(path, "w") as f:
+            f.write(content.replace("\t3072\t", "\t1\t"))
+
+        ingest_diff(
+            self.collection.mission, self.collection.file_type, self.url,
+            self.index_file_name, self.updated_index_file_name, "copy"
+        )
+        self.assertEqual(
+            sorted(
+                self.location.records.filter(
+                    filename="file_3.zip"
+                ).values_list("index_file__filename", "filesize")
+            ), [
+                (other_index_file_name, 3072),
+                (self.updated_index_file_name, 1),
+            ]
+        )
+
+
+class RecordQueriesTestCase(IngestMixIn, TestCase):
+    """ Tests of the queries on the records of an ingested index file.
+    """
+    num_rows = 100
+
+    def assertPagesEqual(self, sort, per_page=7):
+        qs = self.location.records.all()
+        expected = [
+            [record.pk for record in page]
+            for page in (
+                Paginator(
+                    qs.order_by(*filter(None, [sort, "pk"])), per_page
+                ).page(number)
+                for number in range(1, 16)
+            )
+        ]
+        paginator = queries.KeysetPaginator(qs, per_page, sort)
+
+        # walk forwards and backwards through the pages using the cursors
+        page = paginator.page(1)
+        for number in range(2, 16) + range(14, 0, -1):
+            page = paginator.page(number, page.cursor)
+            self.assertEqual(
+                [record.pk for record in page], expected[number - 1]
+            )
+
+        # skip pages and jump to the last page
+        page = paginator.page(6, paginator.page(3).cursor)
+        self.assertEqual([record.pk for record in page], expected[5])
+        page = paginator.page(15, page.cursor)
+        self.assertEqual([record.pk for record in page], expected[14])
+        self.assertFalse(page.has_next())
+
+    def test_keyset_pagination(self):
+        # orbit_direction has many duplicate and empty values
+        for sort in ("filesize", "-filesize", "orbit_direction",
+                     "-orbit_direction", None):
+            self.assertPagesEqual(sort)
+
+    def test_stale_cursor(self):
+        qs = self.location.records.all()
+        first_page = list(qs.order_by("pk")[:7])
+        cursor = queries.KeysetPaginator(qs, 7, search_key="a").page(
+            3, queries.KeysetPaginator(qs, 7, search_key="a").page(2).cursor
+        ).cursor
+
+        # cursors of another search or page size restart at the first page
+        for paginator in (queries.KeysetPaginator(qs, 7, search_key="b"),
+                          queries.KeysetPaginator(qs, 5, search_key="a")):
+            page = paginator.page(4, cursor)
+            self.assertEqual(page.number, 1)
+            self.assertEqual(
+                list(page), first_page[:paginator.per_page]
+            )
+
+        page = queries.KeysetPaginator(qs, 7, search_key="a").page(4, cursor)
+        self.assertEqual(page.number, 4)
+        self.assertEqual(list(page), list(qs.order_by("pk")[21:28]))
+
+    def test_keyset_page_beyond_count(self):
+        # pages beyond the last one are clamped to it
+        qs = self.location.records.all()
+        paginator = queries.KeysetPaginator(qs, 7)
+        last_page = list(qs.order_by("pk")[98:])
+        for cursor in (paginator.page(2).cursor, None):
+            page = paginator.page(20, cursor)
+            self.assertEqual(page.number, 15)
+            self.assertEqual(list(page), last_page)
+            self.assertFalse(page.has_next())
+
+    def test_count_modes(self):
+        qs = self.location.records.filter(orbit_number__lt=50)
+        for mode in queries.COUNT_MODES:
+            count = queries.count_results(qs, mode)
+            self.assertEqual(count, 50)
+            self.assertFalse(count.approximate)
+
+        count = queries.count_results(qs, "explain", 0)
+        self.assertTrue(count.approximate)
+
+    def test_search_overview(self):
+        other = models.Location.objects.create(
+            collection=self.collection, url="http://other.com",
+            location_type="oads"
+        )
+
+        filters = {"orbit_number": [10, 19]}
+        results = queries.search_overview(self.collection, filters)
+        self.assertEqual(results, [
+            (self.location, {
+                "count": 10, "volume": sum(i * 1024 for i in range(10, 20))
+            }),
+            (other, {"count": 0, "volume": None}),
+        ])
+
+    def test_filename_patterns(self):
+        def search(pattern):
+            return sorted(
+                queries.search(
+                    self.collection, {"filename": pattern}
+                ).values_list("filename", flat=True)
+            )
+
+        self.assertEqual(search("*_1.zip"), ["file_1.zip"])
+        self.assertEqual(len(search("file_1*")), 11)
+        self.assertEqual(len(search("*_1*")), 11)
+        self.assertEqual(
+            search("file*9.zip"),
+            sorted("file_%d.zip" % i for i in range(9, 100, 10))
+        )
+        self.assertEqual(search("*e%1.zip"), [])
+        self.assertEqual(search("*e_1.zip"), ["file_1.zip"])
+
+    def test_stream_values(self):
+        qs = self.location.records.filter(orbit_number__lt=50).order_by("pk")
+
+        self.assertEqual(
+            list(queries.stream_values(qs, "filename", batch_size=7)),
+            list(qs.values_list("filename"))
+        )
+        self.assertEqual(
+            list(queries.stream_values(qs, "pk", flat=True)),
+            list(qs.values_list("pk", flat=True))
+        )
+        # geometries are converted like with values_list
+        self.assertEqual(
+            list(queries.stream_values(qs, "filename", "footprint")),
+            list(qs.values_list("filename", "footprint"))
+        )
+        self.assertEqual(
+            list(queries.stream_values(qs.filter(pk__in=[]), "pk")), []
+        )
+
+    def test_annotate(self):
+        qs = self.location.records.filter(orbit_number__lt=50)
+
+        self.assertEqual(annotate(qs, "bulk"), 50)
+        self.assertEqual(annotate(qs.filter(pk__in=[]), "none"), 0)
+        self.assertEqual(
+            models.Annotation.objects.filter(
+                text="bulk", record__orbit_number__lt=50
+            ).count(), 50
+        )
+
+        self.assertEqual(
+            annotate_filenames(self.location, [
+                ("file_0.zip", "a"), ("file_1.zip", "b"), ("missing", "c")
+            ]), 2
+        )
+        self.assertEqual(
+            sorted(models.Annotation.objects.exclude(text="bulk").values_list(
+                "record__filename", "text"
+            )), [("file_0.zip", "a"), ("file_1.zip", "b")]
+        )
+
+
+class ReloadTestCase(IngestMixIn, TestCase):
+    num_rows = 10
+
+    def test_stash_restore_annotations(self):
+        annotate(self.location.records.filter(orbit_number__lt=5), "kept")
+
+        self.assertEqual(stash_annotations(self.location), 5)
+        self.location.index_files.all().delete()
+        self.write_index_file(None, rows=range(3, 10))
+        self.ingest("copy")
+        self.assertEqual(restore_annotations(self.location), 2)
+        self.assertEqual(
+            sorted(models.Annotation.objects.values_list(
+                "record__orbit_number", flat=True
+            )), [3, 4]
+        )
+
+    def get_files(self):
+        """ Returns the contents of the index files in the directories of the
+        location.
+        """
+        files = {}
+        for name in ("ingested", "pending", "failed"):
+            path = self.get_dir(name)
+            for filename in os.listdir(path) if exists(path) else ():
+                with open(join(path, filename)) as f:
+                    files[join(name, filename)] = f.read()
+        return files
+
+    def test_failed_reload(self):
+        # an index file in the pending directory fails to be ingested
+        path = self.write_index_file(
+            5, "20160102-000000_20160103-000000_20160104-000000.index"
+        )
+        with open(path) as f:
+            content = f.read()
+        with open(path, "w") as f:
+            f.write(content.replace("\t3\t", "\tinvalid\t"))
+        files = self.get_files()
+
+        with self.assertRaises(IngestionError):
+            ReloadCommand().handle_location(self.collection, self.location)
+
+        # the directories are restored from the backup, which is removed
+        self.assertEqual(self.get_files(), files)
+        self.assertEqual([
+            filename for filename in os.listdir(self.collection.data_dir)
+            if filename.startswith(".reload-")
+        ], [])
+        self.assertEqual(
+            list(self.location.index_files.values_list("filename", flat=True)),
+            [self.index_file_name]
+        )
+        self.assertEqual(self.location.records.count(), 10)
+
+
+class UpgradeTestCase(InventoryMixIn, TestCase):
+    def get_columns(self, model):
+        return [
+            column[0] for column in
+            connection.introspection.get_table_description(
+                connection.cursor(), model._meta.db_table
+            )
+        ]
+
+    def test_add_columns(self):
+        location = models.Location.objects.create(
+            collection=models.Collection.objects.create(
+                mission="Landsat5", file_type="SIP-SCENE"
+            ), url="http://test.com", location_type="oads"
+        )
+        cursor = connection.cursor()
+        cursor.execute("ALTER TABLE inventory_indexfile DROP COLUMN complete")
+        cursor.execute("ALTER TABLE inventory_location DROP COLUMN etag")
+        self.assertNotIn("complete", self.get_columns(models.IndexFile))
+
+        UpgradeCommand().add_columns()
+        self.assertIn("complete", self.get_columns(models.IndexFile))
+        self.assertIn("etag", self.get_columns(models.Location))
+
+        # existing rows get the default of the field
+        self.assertIsNone(models.Location.objects.get(pk=location.pk).etag)
+        index_file = location.index_files.create(
+            filename="index", begin_time=now(), end_time=now(),
+            update_time=now()
+        )
+        self.assertTrue(index_file.complete)
+
+
+class StatisticsTestCase(IngestMixIn, TestCase):
+    other_index_file_name = (
+        "20160102-000000_20160103-000000_20160104-000000.index"
+    )
+
+    def test_statistics(self):
+        self.write_index_file(10)
+        self.ingest("copy")
+        self.write_index_file(None, self.other_index_file_name, range(10, 30))
+        self.ingest("copy", self.other_index_file_name)
+
+        statistics = models.LocationStatistics.objects.get(
+            location=self.location
+        )
+        self.assertEqual(statistics.count, 30)
+        self.assertEqual(statistics.volume, sum(range(30)) * 1024)
+        null_counts = statistics.get_null_counts()
+        self.assertEqual(null_counts["orbit_number"], 0)
+        self.assertEqual(null_counts["track"], 30)
+        self.assertEqual(
+            models.IndexFileStatistics.objects.get(
+                index_file__filename=self.other_index_file_name
+            ).count, 20
+        )
+
+        self.location.index_files.get(
+            filename=self.other_index_file_name
+        ).delete()
+        statistics = update_location_statistics(self.location)
+        self.assertEqual(statistics.count, 10)
+        self.assertEqual(statistics.get_null_counts()["track"], 10)
+        self.assertEqual(
+            queries.search_overview(self.collection),
+            [(self.location, {"count": 10, "volume": sum(range(10)) * 1024})]
+        )
+
+
+class ResultListDownloadTestCase(IngestMixIn, TestCase):
+    num_rows = 10
+
+    def load_data(self):
+        super(ResultListDownloadTestCase, self).load_data()
+        config = self.collection.configuration
+        config.available_result_list_fields = ["filesize", "footprint"]
+        config.write()
+
+        User.objects.create_user("test", password="test")
+        self.client.login(username="test", password="test")
+
+    def download(self, **data):
+        data.update({
+            "result_list_location": self.location.pk, "page": "1",
+            "records_per_page": "15"
+        })
+        response = self.client.post(
+            reverse("inventory:collection:result_list", kwargs={
+                "mission": self.collection.mission,
+                "file_type": self.collection.file_type
+            }), data
+        )
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.has_header("Content-Length"))
+        return "".join(response.streaming_content)
+
+    def test_csv(self):
+        rows = list(csv.reader(StringIO(self.download(download_csv="1"))))
+        self.assertEqual(rows[0], ["filename", "filesize", "footprint"])
+        self.assertEqual(len(rows), 11)
+        for filename, filesize, footprint in rows[1:]:
+            record = self.location.records.get(filename=filename)
+            self.assertEqual(int(filesize), record.filesize)
+            # geometries are exported as text, not as hex EWKB
+            self.assertEqual(footprint, str(record.footprint))
+            self.assertEqual(GEOSGeometry(footprint), record.footprint)
+
+    def test_filenames(self):
+        filenames = self.download(download_filenames="1").splitlines()
+        self.assertEqual(sorted(filenames), sorted(
+            self.location.records.values_list("filename", flat=True)
+        ))
+        self.assertEqual(len(filenames), 10)
+
+    def test_iter_csv(self):
+        rows = [
+            ["file_%d.zip" % i, i, 'a "quoted", value'] for i in range(5000)
+        ]
+        chunks = list(iter_csv(rows))
+        # the rows are joined to a few chunks of whole lines
+        self.assertGreater(len(chunks), 1)
+        self.assertLess(len(chunks), len(rows))
+        for chunk in chunks:
+            self.assertTrue(chunk.endswith("\r\n"))
+        self.assertEqual(
+            list(csv.reader(StringIO("".join(chunks)))),
+            [[str(value) for value in row] for row in rows]
+        )
+
+
+class RowConverterTestCase(TestCase):
+    def test_convert(self):
+        converter = RowConverter([
+            ("filename", "productURI"), ("orbit_number", "orbitNumber"),
+            ("orbit_direction", "orbitDirection")
+        ])
+        convert = converter.bind(
+            ["orbitDirection", "other", "productURI", "orbitNumber"]
+        )
+        self.assertEqual(
+            convert(["DESCENDING", "x", "http://a.com/b/c.zip", "12"]),
+            ["c.zip", 12, "D"]
+        )
+        self.assertEqual(
+            convert(["", "x", "http://a.com/b/c.zip"]), ["c.zip", None, None]
+        )
+
+    def test_missing_column(self):
+        converter = RowConverter([
+            ("filename", "productURI"), ("orbit_number", "orbitNumber")
+        ])
+        with self.assertRaises(IngestionError):
+            converter.bind(["productURI", "other"])
+
+    def test_convert_many(self):
+        converter = RowConverter([
+            ("filename", "productURI"), ("footprint", "footprint")
+        ])
+        convert_many = converter.bind_many(["productURI", "footprint"])
+        rows = convert_many([
+            ["http://a.com/b/c.zip", "10 20 10 21 11 21 11 20 10 20"],
+            ["http://a.com/b/d.zip", ""],
+        ])
+        self.assertEqual(rows[0][0], "c.zip")
+        self.assertEqual(
+            rows[0][1].coords,
+            ((((20, 10), (21, 10), (21, 11), (20, 11), (20, 10)),),)
+        )
+        self.assertEqual(rows[1], ["d.zip", None])
+
+
+class FootprintCacheTestCase(TestCase):
+    def test_cache(self):
+        footprint = "10 20 10 21 11 21 11 20 10 20"
+        other = "10 30 10 31 11 31 11 30 10 30"
+        cache = FootprintCache(1)
+        results = cache.parse_many([footprint, footprint, ""])
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertEqual(results[0], results[1])
+        self.assertIsNone(results[2])
+        self.assertEqual(
+            GEOSGeometry(results[0]), parse_footprint(footprint)
+        )
+        self.assertEqual(GEOSGeometry(results[0]).srid, 4326)
+
+        cache.parse(other)
+        cache.parse(footprint)
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+
+
+class FixFootprintsTestCase(TestCase):
+    footprints = [
+        "10 20 10 21 11 21 11 20 10 20",
+        "10 20 10 21 11 21 11 20",
+        "10 179 10 -179 11 -179 11 179",
+        "-10 -179.5 -10 179.5 -11 179.5 -11 -179.5 -10 -179.5",
+        "10 20 10 21 11 21 11 20|10.2 20.2 10.2 20.4 10.4 20.4 10.2 20.2",
+        "10 190 10 191 11 191 11 190",
+        "89 0 89 120 89 -120",
+        "90 0 89 10 89 20",
+        "10 20 10 21",
+        "10 20 10 20 10 20 10 20",
+        "",
+    ]
+
+    def scalar(self, footprints, **kwargs):
+        results = []
+        for footprint in footprints:
+            try:
+                results.append(fix_footprint(footprint, **kwargs))
+            except Exception as exc:
+                results.append(type(exc))
+        return results
+
+    def test_equivalent(self):
+        for wrap_geometry in (True, False):
+            results = [
+                type(result) if isinstance(result, Exception) else result
+                for result in fix_footprints(
+                    self.footprints, wrap_geometry=wrap_geometry,
+                    return_errors=True
+                )
+            ]
+            self.assertEqual(
+                results,
+                self.scalar(self.footprints, wrap_geometry=wrap_geometry)
+            )
+
+    def test_raise(self):
+        with self.assertRaises(Exception):
+            fix_footprints(self.footprints)
@@ -29,7 +29,7 @@
 DATA_DIR=/srv/minv
 
 python $DATA_DIR/manage.py collectstatic --noinput
-python $DATA_DIR/manage.py syncdb --noinput
+python $DATA_DIR/manage.py upgrade
 
 python $DATA_DIR/manage.py shell 1>/dev/null 2>&1 <<EOF
 from django.contrib.auth.models import Group, Permission
@@ -28,24 +28,41 @@
 
 import itertools
 import urllib2
+import httplib
+import socket
+import time
 from urlparse import urljoin
 from contextlib import closing
 import logging
 import xml.etree.ElementTree as ET
 import os
-from os.path import join, isfile, splitext, basename
+from os.path import (
+    join, isfile, splitext, basename, getsize, dirname, split
+)
 import shutil
 import zipfile
 import re
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from Queue import Queue
 
 from django.utils.datastructures import SortedDict
 from django.utils.timezone import now
+from django.db import transaction
 
 from minv.inventory import models
-from minv.inventory.ingest import ingest
+from minv.inventory.ingest import (
+    ingest, ingest_diff, index_file_path, get_index_file_name
+)
+from minv.inventory.statistics import update_location_statistics
+from minv.inventory.alignment import (
+    rebuild_alignment_index, stash_alignment_filenames,
+    update_stashed_alignment
+)
 from minv.utils import Timer, safe_makedirs
 from minv.tasks.registry import task
 from minv.tasks.api import schedule
+from minv.tasks.httppool import PoolManager
 
 logger = logging.getLogger(__name__)
 
@@ -58,9 +75,18 @@ class RetrieveError(Exception):
     pass
 
 
+class NotModified(Exception):
+    """ Exception raised by :meth:`BaseHarvester.scan` when the location was
+    not modified since the last harvest.
+    """
+    pass
+
+
 @task
-def harvest(mission, file_type, url, reschedule=False):
+def harvest(mission, file_type, url, reschedule=False, force=False):
     """ Performs the harvesting for the specified collection and location.
+    Unless ``force`` is set, the harvesting is skipped when the location was
+    not modified since the last successful harvest.
     Returns
     """
 
@@ -68,24 +94,39 @@ def harvest(mission, file_type, url, reschedule=False):
         mission=mission, file_type=file_type
     )
     with collection.get_lock():
-        return _harvest_locked(collection, url, reschedule)
+        return _harvest_locked(collection, url, reschedule, force)
 
 
-def _harvest_locked(collection, url, reschedule):
+def _harvest_locked(collection, url, reschedule, force=False):
     location = collection.locations.get(url=url)
+    configuration = collection.configuration
 
     if location.location_type == "oads":
-        harvester = OADSHarvester(location)
+        harvester_class = OADSHarvester
     elif location.location_type == "nga":
-        harvester = NGAHarvester(location)
+        harvester_class = NGAHarvester
     else:
         raise HarvestingError(
             "Invalid location type '%s'." % location.location_type
         )
+    harvester = harvester_class(
+        location, configuration.http_timeout, configuration.http_pool_size,
+        configuration.retrieve_retries, configuration.retrieve_backoff
+    )
 
     # scan the source
     logger.debug("Scanning location %s." % location)
-    available_index_files = harvester.scan()
+    try:
+        available_index_files = harvester.scan(conditional=not force)
+    except NotModified:
+        logger.info(
+            "Skipped harvesting for %s: %s. The location was not modified."
+            % (collection, location)
+        )
+        harvester.close()
+        if reschedule:
+            _reschedule(collection, location)
+        return [], []
     logger.debug("Successfully scanned location %s." % location)
 
     # categorize files
@@ -101,74 +142,150 @@ def _harvest_locked(collection, url, reschedule):
     safe_makedirs(pending_dir)
     safe_makedirs(ingested_dir)
 
-    failed_retrieve = []
-
     updated_to_retrieve = [u[1] for u in updated]
 
-    # perform actual harvesting
-    for index_file_name in itertools.chain(inserted, updated_to_retrieve):
-        try:
-            harvester.retrieve(
-                join(url, index_file_name), index_file_name, pending_dir
-            )
-            logger.debug("Retrieved %s." % index_file_name)
-        except:
-            failed_retrieve.append(index_file_name)
-            logger.debug("Failed to retrieve %s." % index_file_name)
+    # index files of a previously failed checkpointed ingestion are still
+    # pending and can be resumed
+    incomplete = set(
+        location.index_files.filter(complete=False).values_list(
+            "filename", flat=True
+        )
+    )
+    updated_old = [old for old, _ in updated]
+    to_resume = [
+        index_file_name for index_file_name in incomplete
+        if index_file_name not in deleted and
+        index_file_name not in updated_old
+    ]
 
-    updated_to_delete = [u[0] for u in updated]
+    # when ingesting the differences of updated index files, the old index
+    # files are only replaced once the new ones are ingested
+    diff_ingest = configuration.diff_ingest
+    replaced = dict(
+        (get_index_file_name(new), old)
+        for old, new in updated if old not in incomplete
+    ) if diff_ingest else {}
+
+    updated_to_delete = [
+        old for old, new in updated
+        if not diff_ingest or old in incomplete
+    ]
 
     # delete index files that are deleted or updated
-    for index_file_name in itertools.chain(updated_to_delete, deleted):
-        # delete model
-        location.index_files.get(filename=index_file_name).delete()
-        # remove ingested index file
-        os.remove(join(ingested_dir, index_file_name))
+    to_delete = list(itertools.chain(updated_to_delete, deleted))
+    if to_delete:
+        with transaction.atomic():
+            stash_alignment_filenames(
+                collection, location.records.filter(
+                    index_file__filename__in=to_delete
+                )
+            )
+            location.index_files.filter(filename__in=to_delete).delete()
+            update_location_statistics(location)
+            update_stashed_alignment(collection)
+
+    # remove ingested (or incompletely ingested) index files
+    for index_file_name in to_delete:
+        if index_file_name in incomplete:
+            os.remove(index_file_path(pending_dir, index_file_name))
+        else:
+            os.remove(index_file_path(ingested_dir, index_file_name))
 
+    failed_retrieve = []
     failed_ingest = []
+    statistics = HarvestStatistics(extract=False)
 
-    # finally ingest the updated and newly inserted index files
-    for index_file_name in itertools.chain(updated_to_retrieve, inserted):
+    def ingest_index_file(path):
+        index_file_name = basename(path)
         try:
-            index_file_name = extract_zipped_index_file(
-                join(pending_dir, index_file_name)
+            timer = Timer()
+            old_index_file_name = replaced.get(
+                get_index_file_name(index_file_name)
             )
-
-            ingest(
-                collection.mission, collection.file_type, url,
-                basename(index_file_name)
-            )
-            logger.debug("Ingested %s." % basename(index_file_name))
+            if old_index_file_name:
+                count = ingest_diff(
+                    collection.mission, collection.file_type, url,
+                    old_index_file_name, index_file_name
+                )
+            else:
+                count = ingest(
+                    collection.mission, collection.file_type, url,
+                    index_file_name
+                )
+            statistics.add("ingest", count, timer.stop())
+            logger.debug("Ingested %s." % index_file_name)
         except:
-            failed_ingest.append(basename(index_file_name))
-            logger.debug("Failed to ingest %s." % basename(index_file_name))
+            failed_ingest.append(index_file_name)
+            logger.debug("Failed to ingest %s." % index_file_name)
+
+    # perform actual harvesting: the updated and newly inserted index files
+    # are retrieved in the background and each one is ingested as soon as it
+    # is ready. Meanwhile, incomplete ones are resumed. Zipped index files are
+    # ingested from the zip archive directly and kept zipped.
+    retrieved = retrieve_index_files_async(
+        harvester, url, list(itertools.chain(updated_to_retrieve, inserted)),
+        pending_dir, collection.get_retrieve_concurrency(url), extract=False,
+        statistics=statistics
+    )
+    with closing(retrieved):
+        for index_file_name in to_resume:
+            ingest_index_file(index_file_path(pending_dir, index_file_name))
+
+        for index_file_name, path, failed_stage in retrieved:
+            if failed_stage == "retrieve":
+                failed_retrieve.append(index_file_name)
+            else:
+                ingest_index_file(path)
 
+    # close the kept alive connections
+    harvester.close()
+
+    logger.info(
+        "Harvesting pipeline statistics for %s: %s" % (location, statistics)
+    )
     logger.info("Finished harvesting for %s: %s" % (collection, location))
     if failed_retrieve:
         logger.error("Failed to retrieve %s" % ", ".join(failed_retrieve))
     if failed_ingest:
         logger.error("Failed to ingest %s" % ", ".join(failed_ingest))
 
+    # the alignment index has to be rebuilt when it is not usable, e.g. when
+    # a location was added to the collection
+    if not models.Collection.objects.filter(
+            pk=collection.pk, alignment_indexed=True).exists():
+        rebuild_alignment_index(collection)
+
+    # remember the state of the scanned listing for the next conditional
+    # scan, but only when everything was harvested
+    if not failed_retrieve and not failed_ingest:
+        models.Location.objects.filter(pk=location.pk).update(
+            etag=harvester.etag, last_modified=harvester.last_modified
+        )
+
     # if this was a scheduled harvest, reschedule it again
     if reschedule:
-        try:
-            interval = collection.configuration.harvest_interval
-            schedule("harvest", now() + interval, {
-                "mission": collection.mission,
-                "file_type": collection.file_type,
-                "url": location.url,
-                "reschedule": True
-            })
-        except Exception as exc:
-            logger.error(
-                "Failed to reschedule harvest for %s %s. Error was '%s'." % (
-                    collection, location, exc
-                )
-            )
+        _reschedule(collection, location)
 
     return failed_retrieve, failed_ingest
 
 
+def _reschedule(collection, location):
+    try:
+        interval = collection.configuration.harvest_interval
+        schedule("harvest", now() + interval, {
+            "mission": collection.mission,
+            "file_type": collection.file_type,
+            "url": location.url,
+            "reschedule": True
+        })
+    except Exception as exc:
+        logger.error(
+            "Failed to reschedule harvest for %s %s. Error was '%s'." % (
+                collection, location, exc
+            )
+        )
+
+
 def select_index_files(available_index_files, ingested_index_files):
     """ Split the supplied available index files and already ingested index
     files to three separate lists:
@@ -205,6 +322,117 @@ def select_index_files(available_index_files, ingested_index_files):
     return index_files_inserted, index_files_updated, index_files_deleted
 
 
+class HarvestStatistics(object):
+    """ Statistics of the stages of the harvesting pipeline: the number of
+    processed index files, the processed amount (bytes or records) and the
+    accumulated processing time of each stage, as well as the depth of the
+    queue of index files waiting for ingestion. The ``extract`` stage is only
+    accounted for when index files are extracted. Thread safe.
+    """
+
+    stages = (
+        ("retrieve", "bytes"), ("extract", "bytes"), ("ingest", "records")
+    )
+
+    def __init__(self, extract=True):
+        if not extract:
+            self.stages = tuple(
+                (stage, unit) for stage, unit in self.stages
+                if stage != "extract"
+            )
+        self.timer = Timer()
+        self.counts = dict((stage, [0, 0, 0.0]) for stage, _ in self.stages)
+        self.queue_depths = []
+        self._lock = Lock()
+
+    def add(self, stage, amount, duration):
+        """ Account for an index file processed by the given stage. """
+        with self._lock:
+            counts = self.counts[stage]
+            counts[0] += 1
+            counts[1] += amount
+            counts[2] += duration
+
+    def add_queue_depth(self, depth):
+        """ Sample the number of index files waiting for ingestion. """
+        with self._lock:
+            self.queue_depths.append(depth)
+
+    def __str__(self):
+        parts = []
+        for stage, unit in self.stages:
+            files, amount, duration = self.counts[stage]
+            parts.append(
+                "%s %d files (%d %s) in %.3fs, %.1f files/s, %.1f %s/s" % (
+                    stage, files, amount, unit, duration,
+                    files / duration if duration else 0.0,
+                    amount / duration if duration else 0.0, unit
+                )
+            )
+        depths = self.queue_depths or [0]
+        parts.append("queue depth max %d, mean %.1f" % (
+            max(depths), sum(depths) / float(len(depths))
+        ))
+        parts.append("total %.3fs" % self.timer.stop())
+        return "; ".join(parts)
+
+
+def retrieve_index_files_async(harvester, url, index_file_names, target_dir,
+                               concurrency=1, extract=True, statistics=None):
+    """ Start retrieving the given index files from the location ``url`` to
+    the ``target_dir`` using the ``harvester`` in a pool of ``concurrency``
+    background threads. Unless disabled via ``extract``, zipped index files
+    are extracted right after their retrieval.
+
+    Returns an iterator yielding 3-tuples of the index file name, the path of
+    the retrieved (and extracted) index file and the name of the failed stage
+    (``"retrieve"`` or ``"extract"``) or ``None``, as soon as each index file
+    is ready. Closing the iterator stops the retrieval of the remaining index
+    files.
+    """
+    statistics = statistics or HarvestStatistics(extract)
+    ready = Queue()
+
+    def retrieve(index_file_name):
+        path = join(target_dir, index_file_name)
+        failed_stage = "retrieve"
+        try:
+            timer = Timer()
+            harvester.retrieve(
+                join(url, index_file_name), index_file_name, target_dir
+            )
+            statistics.add("retrieve", getsize(path), timer.stop())
+            logger.debug("Retrieved %s." % index_file_name)
+
+            if extract:
+                failed_stage = "extract"
+                timer = Timer()
+                path = extract_zipped_index_file(path)
+                statistics.add("extract", getsize(path), timer.stop())
+            failed_stage = None
+        except Exception:
+            logger.debug(
+                "Failed to %s %s." % (failed_stage, index_file_name)
+            )
+        finally:
+            ready.put((index_file_name, path, failed_stage))
+
+    pool = ThreadPool(max(1, min(concurrency, len(index_file_names))))
+    pool.map_async(retrieve, index_file_names, chunksize=1)
+    pool.close()
+
+    def iterate():
+        try:
+            for _ in index_file_names:
+                statistics.add_queue_depth(ready.qsize())
+                yield ready.get()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    return iterate()
+
+
 CHUNK_SIZE = 64*1024  # 64kB block size
 
 
@@ -243,16 +471,169 @@ def extract_zipped_index_file(src_file):
 
 
 class BaseHarvester(object):
-    def __init__(self, location, timeout=None):
+    """ Base class for harvesters. All requests of a harvester are sent via
+    a pool of persistent connections per host, reused for the scan and the
+    retrieval of the index files.
+    """
+    def __init__(self, location, timeout=None, pool_size=4, retries=3,
+                 backoff=1.0):
         self.location = location
         self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.http = PoolManager(pool_size, timeout)
+        # validators of the scanned listing
+        self.etag = None
+        self.last_modified = None
+
+    def open(self, url, headers=None):
+        """ Open the given URL, like :func:`urllib2.urlopen`. """
+        return self.http.urlopen(url, headers=headers)
+
+    def open_listing(self, url, conditional=True):
+        """ Open the listing of the location at the given URL and record its
+        ETag and Last-Modified validators. If ``conditional`` is set, the
+        validators stored for the location are sent along and
+        :exc:`NotModified` is raised if the listing is unchanged.
+        """
+        headers = {}
+        if conditional:
+            etag = getattr(self.location, "etag", None)
+            last_modified = getattr(self.location, "last_modified", None)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            handle = self.open(url, headers)
+        except urllib2.HTTPError as exc:
+            if exc.code == 304:
+                raise NotModified
+            raise
+        self.etag = handle.getheader("etag")
+        self.last_modified = handle.getheader("last-modified")
+        return handle
+
+    def close(self):
+        """ Close the idle connections of the harvester. """
+        self.http.close()
+
+    def download(self, url, path):
+        """ Download the file at the given URL to ``path``. The data is
+        stored in a temporary file, renamed when the download is complete.
+        An interrupted download is retried up to :attr:`retries` times, with
+        an exponentially growing delay starting at :attr:`backoff` seconds,
+        and resumed using a HTTP Range request. The temporary file is kept
+        when the download finally fails, so that a later retrieval can
+        resume it, too. It is stored outside of the target directory (see
+        :func:`get_partial_path`), so that it is never taken for a retrieved
+        file. The final size is checked against the announced
+        size of the file.
+        Returns the size of the file and a description of the outcome.
+        """
+        tmp_path = get_partial_path(path)
+        safe_makedirs(dirname(tmp_path))
+        resumed_from = None
+        attempt = 0
+        while True:
+            offset = getsize(tmp_path) if isfile(tmp_path) else 0
+            headers = {"Range": "bytes=%d-" % offset} if offset else {}
+            try:
+                try:
+                    fin = self.open(url, headers)
+                except urllib2.HTTPError as exc:
+                    if exc.code != 416:
+                        raise
+                    # the temporary file does not fit the requested file
+                    os.remove(tmp_path)
+                    raise RetrieveError(str(exc))
+
+                with closing(fin):
+                    expected_size = get_total_size(fin)
+                    if fin.status == 206:
+                        mode = "ab"
+                        if resumed_from is None:
+                            resumed_from = offset
+                    else:
+                        # the server sent the whole file
+                        mode = "wb"
+                    with open(tmp_path, mode) as fout:
+                        shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+
+                size = getsize(tmp_path)
+                if expected_size is not None and size != expected_size:
+                    raise RetrieveError(
+                        "Incomplete download of %s: got %d of %d bytes"
+                        % (url, size, expected_size)
+                    )
+                os.rename(tmp_path, path)
+                break
+
+            except urllib2.HTTPError as exc:
+                if exc.code < 500:
+                    # the file is not available, no need to retry
+                    logger.error("Error retrieving %s: %s", url, exc)
+                    if isfile(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                error = exc
+            except (RetrieveError, IOError, socket.error,
+                    httplib.HTTPException) as exc:
+                error = exc
+
+            if attempt >= self.retries:
+                logger.error(
+                    "Error retrieving %s after %d attempts: %s",
+                    url, attempt + 1, error
+                )
+                raise RetrieveError(str(error))
 
-    def scan(self):
+            delay = self.backoff * 2 ** attempt
+            attempt += 1
+            logger.warning(
+                "Error retrieving %s: %s. Retrying in %.1fs (%d/%d)",
+                url, error, delay, attempt, self.retries
+            )
+            time.sleep(delay)
+
+        outcome = "complete"
+        if resumed_from is not None:
+            outcome = "resumed from %dB" % resumed_from
+        if attempt:
+            outcome += " after %d retries" % attempt
+        return size, outcome
+
+    def scan(self, conditional=True):
         pass
 
     def retrieve(self, url, file_name, target_dir):
         pass
 
+
+def get_partial_path(path):
+    """ Get the path of the temporary file of a download to ``path``. It is
+    stored in a ``.partial`` directory next to the target directory, e.g.
+    ``pending/<location>.partial/`` for the ``pending/<location>/`` directory
+    of index files, which is scanned for index files to ingest.
+    """
+    target_dir, file_name = split(path)
+    return join(target_dir + ".partial", file_name)
+
+
+def get_total_size(response):
+    """ Get the total size of the file of a response, if announced by the
+    server. For partial responses the size is taken from the Content-Range
+    header.
+    """
+    if response.status == 206:
+        content_range = response.getheader("content-range", "")
+        total = content_range.rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+
+    length = response.getheader("content-length")
+    return int(length) if length and length.isdigit() else None
+
 # index file naming convention
 RE_INDEX_PATTERN = r"\d{8,8}-\d{6,6}_\d{8,8}-\d{6,6}_\d{8,8}-\d{6,6}.index"
 RE_INDEX = re.compile("^%s$" % RE_INDEX_PATTERN)
@@ -260,16 +641,18 @@ RE_INDEX_FILE = re.compile(r"^%s(?:\.zip)?$" % RE_INDEX_PATTERN)
 
 
 class OADSHarvester(BaseHarvester):
-    def scan(self):
+    def scan(self, conditional=True):
         try:
             url = self.location.url
-            with closing(urllib2.urlopen(url, timeout=self.timeout)) as handle:
+            with closing(self.open_listing(url, conditional)) as handle:
                 logger.debug("Scanning: Got response from: %s", handle.geturl())
                 index_files = [
                     idx_file
-                    for idx_file in extract_index_hrefs(handle, handle.geturl())
+                    for idx_file in iter_index_hrefs(handle, handle.geturl())
                     if RE_INDEX_FILE.match(idx_file[0])
                 ]
+        except NotModified:
+            raise
         except Exception as exc:
             logger.error("Error parsing %s: %s", url, exc)
             raise
@@ -279,39 +662,28 @@ class OADSHarvester(BaseHarvester):
 
     def retrieve(self, url, file_name, target_dir):
         path = join(target_dir, file_name)
-        tmp_path = path + ".tmp"
         logger.debug("Retrieving %s and storing it under %s", url, path)
         timer = Timer()
-        try:
-            with closing(urllib2.urlopen(url, timeout=self.timeout)) as fin:
-                with open(tmp_path, "wb") as fout:
-                    shutil.copyfileobj(fin, fout, 64*1024)
-                    size = fout.tell()
-            os.rename(tmp_path, path)
-        except IOError as exc:
-            logger.error("Error saving %s: %s", path, exc)
-            raise RetrieveError(str(exc))
-        except Exception as exc:
-            logger.error("Error retrieving %s: %s", url, exc)
-            raise
-        finally:
-            if isfile(tmp_path):
-                os.remove(tmp_path)
-        logger.info("'%s' -> '%s' %dB %.3fs", url, path, size, timer.stop())
+        size, outcome = self.download(url, path)
+        logger.info(
+            "'%s' -> '%s' %dB %.3fs %s", url, path, size, timer.stop(), outcome
+        )
         return file_name
 
 
 class NGAHarvester(BaseHarvester):
-    def scan(self):
+    def scan(self, conditional=True):
         try:
             url = self.location.url
-            with closing(urllib2.urlopen(url, timeout=self.timeout)) as handle:
+            with closing(self.open_listing(url, conditional)) as handle:
                 logger.debug("Scanning: Got response from: %s", handle.geturl())
                 index_files = [
                     idx_file
-                    for idx_file in extract_index_hrefs(handle, handle.geturl())
+                    for idx_file in iter_index_hrefs(handle, handle.geturl())
                     if RE_INDEX_FILE.match(idx_file[0])
                 ]
+        except NotModified:
+            raise
         except Exception as exc:
             logger.error("Error parsing %s: %s", url, exc)
             raise
@@ -321,25 +693,12 @@ class NGAHarvester(BaseHarvester):
 
     def retrieve(self, url, file_name, target_dir):
         path = join(target_dir, file_name)
-        tmp_path = path + ".tmp"
         logger.debug("Retrieving %s and storing it under %s", url, path)
         timer = Timer()
-        try:
-            with closing(urllib2.urlopen(url, timeout=self.timeout)) as fin:
-                with open(tmp_path, "wb") as fout:
-                    shutil.copyfileobj(fin, fout, 64*1024)
-                    size = fout.tell()
-            os.rename(tmp_path, path)
-        except IOError as exc:
-            logger.error("Error saving %s: %s", path, exc)
-            raise RetrieveError(str(exc))
-        except Exception as exc:
-            logger.error("Error retrieving %s: %s", url, exc)
-            raise
-        finally:
-            if isfile(tmp_path):
-                os.remove(tmp_path)
-        logger.info("'%s' -> '%s' %dB %.3fs", url, path, size, timer.stop())
+        size, outcome = self.download(url, path)
+        logger.info(
+            "'%s' -> '%s' %dB %.3fs %s", url, path, size, timer.stop(), outcome
+        )
         return file_name
 
 
@@ -349,13 +708,27 @@ def extract_index_hrefs(source, base_url=None):
     Note that the subroutine currently does not intepret the <base> HTML
     element!
     """
-    root = ET.parse(source, parser=None)
-    return [
-        # the ".//*/a[@class='index-file']" expression does not seem to work
-        # with Python 2.6s XPath engine. Workaround:
-        (el.attrib["href"].split("/")[-1], urljoin(base_url, el.attrib["href"]))
-        for el in itertools.chain(
-            root.findall(".//*/{http://www.w3.org/1999/xhtml}a"),
-            root.findall(".//*/a"),
-        ) if el.attrib.get("class") == "index-file"
-    ]
+    return list(iter_index_hrefs(source, base_url))
+
+
+def iter_index_hrefs(source, base_url=None):
+    """ Streaming version of :func:`extract_index_hrefs`, yielding the index
+    file name and URL pairs while parsing the index.html file. The parsed
+    elements are discarded, so the document tree is never built completely.
+    """
+    anchor_tags = ("{http://www.w3.org/1999/xhtml}a", "a")
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag in anchor_tags and elem.attrib.get("class") == "index-file":
+            href = elem.attrib["href"]
+            yield (href.split("/")[-1], urljoin(base_url, href))
+
+        # discard the completely parsed elements
+        elem.clear()
+        if elem is not root:
+            root.clear()
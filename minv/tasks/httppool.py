@@ -0,0 +1,279 @@
+# ------------------------------------------------------------------------------
+#
+# Project: Master Inventory <http://github.com/ESA-MInv/minv>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+# ------------------------------------------------------------------------------
+# Copyright (C) 2016 European Space Agency
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+import httplib
+import socket
+import urllib
+import urllib2
+from base64 import b64encode
+from urlparse import urlsplit, urljoin
+from threading import Lock
+
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class HTTPConnectionPool(object):
+    """ Pool of persistent HTTP connections to a single host. Connections
+    are created on demand, so concurrent requests never block. At most
+    ``maxsize`` idle connections are kept for later requests.
+
+    If a ``proxy`` URL is given, the connections are made to the proxy
+    instead. HTTPS requests are tunneled through it.
+    """
+
+    def __init__(self, scheme, host, port=None, maxsize=4, timeout=None,
+                 proxy=None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.proxy = urlsplit(proxy) if proxy else None
+        self.num_connections = 0
+        self.num_requests = 0
+        self._idle = []
+        self._lock = Lock()
+
+    def _get_connection(self):
+        """ Get an idle connection or create a new one. Returns a 2-tuple of
+        the connection and whether it is re-used.
+        """
+        with self._lock:
+            self.num_requests += 1
+            if self._idle:
+                return self._idle.pop(), True
+            self.num_connections += 1
+
+        if self.scheme == "https":
+            connection_class = httplib.HTTPSConnection
+        else:
+            connection_class = httplib.HTTPConnection
+
+        # without a timeout, the default of httplib applies
+        kwargs = {}
+        if self.timeout is not None:
+            kwargs["timeout"] = self.timeout
+
+        proxy = self.proxy
+        if proxy is None:
+            connection = connection_class(self.host, self.port, **kwargs)
+        elif self.scheme == "https":
+            connection = connection_class(
+                proxy.hostname, proxy.port, **kwargs
+            )
+            connection.set_tunnel(
+                self.host, self.port, self._get_proxy_headers()
+            )
+        else:
+            connection = httplib.HTTPConnection(
+                proxy.hostname, proxy.port, **kwargs
+            )
+        return connection, False
+
+    def _get_proxy_headers(self):
+        """ Get the headers to authenticate with the proxy, if its URL
+        contains credentials.
+        """
+        if self.proxy is None or self.proxy.username is None:
+            return {}
+        credentials = "%s:%s" % (
+            urllib.unquote(self.proxy.username),
+            urllib.unquote(self.proxy.password or "")
+        )
+        return {"Proxy-Authorization": "Basic %s" % b64encode(credentials)}
+
+    def _put_connection(self, connection):
+        """ Return a connection to the pool or close it if the pool is full.
+        """
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, path, headers=None):
+        """ Send a request and return the :class:`PooledResponse`. A request
+        failing on a re-used connection, possibly closed by the server in the
+        meantime, is repeated.
+        """
+        if self.proxy is not None and self.scheme == "http":
+            # plain HTTP proxies expect the absolute URL
+            netloc = self.host
+            if self.port:
+                netloc = "%s:%d" % (netloc, self.port)
+            path = "http://%s%s" % (netloc, path)
+            headers = dict(headers or {}, **self._get_proxy_headers())
+
+        while True:
+            connection, reused = self._get_connection()
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+            except (httplib.HTTPException, socket.error):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            return PooledResponse(self, connection, response)
+
+    def close(self):
+        """ Close all idle connections. """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class PooledResponse(object):
+    """ File-like wrapper of a response of a :class:`HTTPConnectionPool`.
+    When closed, the connection is returned to the pool if the response was
+    read completely and the server allows to keep the connection alive.
+    """
+
+    def __init__(self, pool, connection, response, url=None):
+        self.pool = pool
+        self.url = url
+        self._connection = connection
+        self._response = response
+
+    @property
+    def status(self):
+        return self._response.status
+
+    @property
+    def reason(self):
+        return self._response.reason
+
+    def read(self, amt=None):
+        return self._response.read(amt)
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+    def info(self):
+        return self._response.msg
+
+    def geturl(self):
+        return self.url
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        response = self._response
+        if response.isclosed() and not response.will_close:
+            self.pool._put_connection(connection)
+        else:
+            response.close()
+            connection.close()
+
+
+class PoolManager(object):
+    """ Manager of one :class:`HTTPConnectionPool` per host, following
+    redirects across hosts. The pools share the ``maxsize`` and ``timeout``
+    settings.
+
+    Like :func:`urllib2.urlopen`, the proxies are taken from the
+    ``http_proxy`` and ``https_proxy`` environment variables, unless they are
+    passed as a dict of scheme to proxy URL. Hosts listed in ``no_proxy`` are
+    connected to directly.
+    """
+
+    def __init__(self, maxsize=4, timeout=None, max_redirects=5,
+                 proxies=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.proxies = urllib.getproxies() if proxies is None else proxies
+        self.pools = {}
+        self._lock = Lock()
+
+    def get_proxy(self, url):
+        """ Get the URL of the proxy to use for the given URL or ``None``. """
+        parts = urlsplit(url)
+        proxy = self.proxies.get(parts.scheme)
+        if proxy and not urllib.proxy_bypass(parts.hostname):
+            return proxy
+        return None
+
+    def connection_from_url(self, url):
+        """ Get the connection pool for the host of the given URL. """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        with self._lock:
+            try:
+                return self.pools[key]
+            except KeyError:
+                pool = self.pools[key] = HTTPConnectionPool(
+                    parts.scheme, parts.hostname, parts.port, self.maxsize,
+                    self.timeout, self.get_proxy(url)
+                )
+                return pool
+
+    def urlopen(self, url, method="GET", headers=None):
+        """ Open the given URL and return the :class:`PooledResponse`.
+        Redirects are followed and unsuccessful responses are raised as
+        :class:`urllib2.HTTPError`, like with :func:`urllib2.urlopen`.
+        """
+        for _ in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path = "%s?%s" % (path, parts.query)
+
+            response = self.connection_from_url(url).request(
+                method, path, headers
+            )
+            response.url = url
+            location = response.getheader("location")
+            if response.status in REDIRECT_CODES and location:
+                response.read()
+                response.close()
+                url = urljoin(url, location)
+                continue
+
+            if not 200 <= response.status < 300:
+                response.read()
+                response.close()
+                raise urllib2.HTTPError(
+                    url, response.status, response.reason, response.info(),
+                    None
+                )
+            return response
+
+        raise urllib2.HTTPError(
+            url, response.status, "Too many redirects", response.info(), None
+        )
+
+    def close(self):
+        """ Close the idle connections of all pools. """
+        with self._lock:
+            pools = self.pools.values()
+        for pool in pools:
+            pool.close()
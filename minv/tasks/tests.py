@@ -0,0 +1,419 @@
+# ------------------------------------------------------------------------------
+#
+# Project: Master Inventory <http://github.com/ESA-MInv/minv>
+# Authors: Fabian Schindler <fabian.schindler@eox.at>
+#
+# ------------------------------------------------------------------------------
+# Copyright (C) 2016 European Space Agency
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies of this Software or works derived from this Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ------------------------------------------------------------------------------
+
+
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from threading import Thread
+from tempfile import mkdtemp
+from os import listdir, getcwd, chdir, environ
+from os.path import join, isfile, getmtime, getsize, exists
+from StringIO import StringIO
+from urlparse import urlsplit
+import shutil
+import zipfile
+import urllib2
+import socket
+import re
+
+from django.test import SimpleTestCase, TestCase
+
+from minv.inventory import queries
+from minv.inventory import ingest as ingest_module
+from minv.inventory.ingest import IngestionError
+from minv.inventory.testing import IngestMixIn
+from minv.tasks.httppool import PoolManager
+from minv.tasks.harvest import (
+    OADSHarvester, HarvestStatistics, NotModified, RetrieveError,
+    retrieve_index_files_async, iter_index_hrefs,
+    get_partial_path, harvest
+)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
+    # allow persistent connections
+    protocol_version = "HTTP/1.1"
+    num_connections = 0
+    # number of bytes after which the next response is interrupted
+    interrupt_after = None
+
+    def setup(self):
+        QuietHTTPRequestHandler.num_connections += 1
+        # avoid the delays of Nagle's algorithm on persistent connections,
+        # as a real web server would
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        SimpleHTTPRequestHandler.setup(self)
+
+    def do_GET(self):
+        # accept the absolute URLs sent to proxies, standing in for one
+        if self.path.startswith("http://"):
+            self.path = urlsplit(self.path).path
+        # support conditional and range requests, like a real web server
+        path = self.translate_path(self.path)
+        if not isfile(path):
+            return SimpleHTTPRequestHandler.do_GET(self)
+
+        last_modified = self.date_time_string(getmtime(path))
+        if self.headers.get("If-Modified-Since") == last_modified:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        with open(path, "rb") as f:
+            data = f.read()
+        match = re.match(r"^bytes=(\d+)-$", self.headers.get("Range", ""))
+        start = int(match.group(1)) if match else 0
+        if match:
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (
+                start, len(data) - 1, len(data)
+            ))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+
+        data = data[start:]
+        interrupt_after = QuietHTTPRequestHandler.interrupt_after
+        if interrupt_after is not None:
+            QuietHTTPRequestHandler.interrupt_after = None
+            data = data[:interrupt_after]
+            self.close_connection = 1
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPServerMixIn(object):
+    """ Mix-in to serve the files of a temporary directory via a local HTTP
+    server, standing in for a remote location.
+    """
+
+    def setUp(self):
+        super(HTTPServerMixIn, self).setUp()
+        self.served_dir = mkdtemp()
+        self.target_dir = mkdtemp()
+        self.cwd = getcwd()
+        # the request handler serves the current working directory
+        chdir(self.served_dir)
+        self.server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), QuietHTTPRequestHandler
+        )
+        self.url = "http://127.0.0.1:%d" % self.server.server_port
+        QuietHTTPRequestHandler.num_connections = 0
+        QuietHTTPRequestHandler.interrupt_after = None
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        chdir(self.cwd)
+        shutil.rmtree(self.served_dir)
+        shutil.rmtree(self.target_dir)
+        shutil.rmtree(self.target_dir + ".partial", True)
+        super(HTTPServerMixIn, self).tearDown()
+
+    def serve(self, file_name, content):
+        with open(join(self.served_dir, file_name), "w") as f:
+            f.write(content)
+
+
+class RetrieveIndexFilesTestCase(HTTPServerMixIn, SimpleTestCase):
+    def test_concurrent_retrieve(self):
+        names = ["%02d.index" % i for i in range(20)]
+        for name in names:
+            self.serve(name, name * 1000)
+
+        retrieved = retrieve_index_files_async(
+            OADSHarvester(None), self.url, names + ["missing.index"],
+            self.target_dir, concurrency=4, extract=False
+        )
+        failed = [
+            index_file_name for index_file_name, _, failed_stage in retrieved
+            if failed_stage
+        ]
+
+        self.assertEqual(failed, ["missing.index"])
+        # no temporary files are left behind
+        self.assertEqual(sorted(listdir(self.target_dir)), names)
+        for name in names:
+            with open(join(self.target_dir, name)) as f:
+                self.assertEqual(f.read(), name * 1000)
+
+    def test_pipeline(self):
+        self.serve("a.index", "a" * 1000)
+        zipped = join(self.served_dir, "b.index.zip")
+        with zipfile.ZipFile(zipped, "w") as archive:
+            archive.writestr("b.index", "b" * 1000)
+
+        statistics = HarvestStatistics()
+        retrieved = retrieve_index_files_async(
+            OADSHarvester(None), self.url,
+            ["a.index", "b.index.zip", "missing.index"], self.target_dir,
+            concurrency=2, statistics=statistics
+        )
+        results = sorted(retrieved)
+
+        self.assertEqual(results, [
+            ("a.index", join(self.target_dir, "a.index"), None),
+            ("b.index.zip", join(self.target_dir, "b.index"), None),
+            ("missing.index", join(self.target_dir, "missing.index"),
+             "retrieve"),
+        ])
+        self.assertEqual(
+            sorted(listdir(self.target_dir)), ["a.index", "b.index"]
+        )
+        self.assertEqual(statistics.counts["retrieve"][0], 2)
+        self.assertEqual(statistics.counts["extract"][:2], [2, 2000])
+        self.assertEqual(len(statistics.queue_depths), 3)
+
+    def test_pipeline_without_extraction(self):
+        self.serve("a.index", "a" * 1000)
+        statistics = HarvestStatistics(extract=False)
+        retrieved = retrieve_index_files_async(
+            OADSHarvester(None), self.url, ["a.index"], self.target_dir,
+            extract=False, statistics=statistics
+        )
+        list(retrieved)
+
+        self.assertEqual(statistics.counts["retrieve"][:2], [1, 1000])
+        self.assertNotIn("extract", statistics.counts)
+        self.assertNotIn("extract", str(statistics))
+
+
+class HTTPPoolTestCase(HTTPServerMixIn, SimpleTestCase):
+    def test_keep_alive(self):
+        names = ["%02d.index" % i for i in range(50)]
+        for name in names:
+            self.serve(name, name * 1000)
+
+        def fetch_all(urlopen):
+            QuietHTTPRequestHandler.num_connections = 0
+            for name in names:
+                handle = urlopen(join(self.url, name))
+                self.assertEqual(handle.read(), name * 1000)
+                handle.close()
+
+        fetch_all(urllib2.urlopen)
+        self.assertEqual(QuietHTTPRequestHandler.num_connections, 50)
+
+        # the pool sends all requests over a single connection
+        http = PoolManager()
+        fetch_all(http.urlopen)
+        pool = http.connection_from_url(self.url)
+        http.close()
+        self.assertEqual(QuietHTTPRequestHandler.num_connections, 1)
+        self.assertEqual(pool.num_connections, 1)
+        self.assertEqual(pool.num_requests, 50)
+
+        # the harvester reuses its connection for all retrievals
+        QuietHTTPRequestHandler.num_connections = 0
+        harvester = OADSHarvester(None)
+        for name in names:
+            harvester.retrieve(join(self.url, name), name, self.target_dir)
+        harvester.close()
+        self.assertEqual(QuietHTTPRequestHandler.num_connections, 1)
+
+    def test_proxy(self):
+        self.serve("a.index", "a" * 1000)
+        url = "http://files.invalid/a.index"
+
+        http = PoolManager(proxies={"http": self.url})
+        response = http.urlopen(url)
+        self.assertEqual(response.read(), "a" * 1000)
+        response.close()
+        http.close()
+
+        # like urllib2, the proxy is taken from the environment by default
+        http_proxy = environ.get("http_proxy")
+        environ["http_proxy"] = self.url
+        try:
+            http = PoolManager()
+        finally:
+            if http_proxy is None:
+                del environ["http_proxy"]
+            else:
+                environ["http_proxy"] = http_proxy
+        self.assertEqual(http.get_proxy(url), self.url)
+        response = http.urlopen(url)
+        self.assertEqual(response.read(), "a" * 1000)
+        response.close()
+        http.close()
+
+    def test_errors(self):
+        self.serve("a.index", "a")
+        http = PoolManager(maxsize=1)
+        with self.assertRaises(urllib2.HTTPError):
+            http.urlopen(join(self.url, "missing.index"))
+        response = http.urlopen(join(self.url, "a.index"))
+        self.assertEqual(response.read(), "a")
+        response.close()
+        http.close()
+
+
+INDEX_NAMES = [
+    "20150101-000000_20150102-000000_20150103-000000.index",
+    "20150102-000000_20150103-000000_20150104-000000.index.zip",
+]
+
+LISTING = """<html xmlns="http://www.w3.org/1999/xhtml"><body><ul>
+<li><a class="index-file" href="files/%s">a</a></li>
+<li><a class="other" href="other.html">other</a></li>
+<li><a class="index-file" href="files/%s">b</a></li>
+</ul></body></html>""" % tuple(INDEX_NAMES)
+
+
+class FakeLocation(object):
+    def __init__(self, url, etag=None, last_modified=None):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ScanTestCase(HTTPServerMixIn, SimpleTestCase):
+    def test_iter_index_hrefs(self):
+        self.assertEqual(
+            list(iter_index_hrefs(StringIO(LISTING), "http://a.com/x/")), [
+                (name, "http://a.com/x/files/%s" % name)
+                for name in INDEX_NAMES
+            ]
+        )
+
+    def test_conditional_scan(self):
+        self.serve("index.html", LISTING)
+        location = FakeLocation(join(self.url, "index.html"))
+
+        harvester = OADSHarvester(location)
+        self.assertEqual(
+            [name for name, _ in harvester.scan()], INDEX_NAMES
+        )
+        self.assertIsNotNone(harvester.last_modified)
+
+        # the listing is not modified since
+        location.last_modified = harvester.last_modified
+        with self.assertRaises(NotModified):
+            harvester.scan()
+
+        # unconditional scans always get the listing
+        self.assertEqual(len(harvester.scan(conditional=False)), 2)
+        harvester.close()
+
+
+class DownloadTestCase(HTTPServerMixIn, SimpleTestCase):
+    data = "".join(chr(i % 256) for i in range(100000))
+
+    def setUp(self):
+        super(DownloadTestCase, self).setUp()
+        self.serve("a.index", self.data)
+        self.path = join(self.target_dir, "a.index")
+
+    def test_resume(self):
+        QuietHTTPRequestHandler.interrupt_after = 30000
+        harvester = OADSHarvester(None, backoff=0)
+        size, outcome = harvester.download(
+            join(self.url, "a.index"), self.path
+        )
+        self.assertEqual(size, len(self.data))
+        self.assertEqual(outcome, "resumed from 30000B after 1 retries")
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(listdir(self.target_dir), ["a.index"])
+
+    def test_keep_partial(self):
+        QuietHTTPRequestHandler.interrupt_after = 30000
+        harvester = OADSHarvester(None, retries=0)
+        with self.assertRaises(RetrieveError):
+            harvester.download(join(self.url, "a.index"), self.path)
+        # the partial download is kept outside of the target directory
+        self.assertEqual(listdir(self.target_dir), [])
+        self.assertEqual(getsize(get_partial_path(self.path)), 30000)
+
+        # a later retrieval resumes the download
+        size, outcome = harvester.download(
+            join(self.url, "a.index"), self.path
+        )
+        self.assertEqual(outcome, "resumed from 30000B")
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_missing(self):
+        harvester = OADSHarvester(None, backoff=10)
+        with self.assertRaises(urllib2.HTTPError):
+            harvester.download(
+                join(self.url, "missing.index"),
+                join(self.target_dir, "missing.index")
+            )
+        self.assertEqual(listdir(self.target_dir), [])
+
+
+class HarvestResumeTestCase(IngestMixIn, HTTPServerMixIn, TestCase):
+    def test_resume(self):
+        # a checkpointed ingestion is cut off by an invalid value in row 55
+        chunk_size = ingest_module.CHUNK_SIZE
+        ingest_module.CHUNK_SIZE = 10
+        try:
+            path = self.write_index_file(100)
+            with open(path) as f:
+                content = f.read()
+            with open(path, "w") as f:
+                f.write(content.replace("\t55\t", "\tinvalid\t"))
+            with self.assertRaises(IngestionError):
+                self.ingest("copy", checkpoint_interval=20)
+        finally:
+            ingest_module.CHUNK_SIZE = chunk_size
+        self.assertEqual(queries.search(self.collection).count(), 0)
+
+        # the index file is still listed, so it is resumed instead of being
+        # retrieved again
+        with open(path, "w") as f:
+            f.write(content)
+        self.serve("index.html", """<html><body><ul>
+            <li><a class="index-file" href="%s">a</a></li>
+        </ul></body></html>""" % self.index_file_name)
+        self.assertEqual(
+            harvest(
+                self.collection.mission, self.collection.file_type, self.url
+            ), ([], [])
+        )
+
+        self.assertTrue(self.location.index_files.get().complete)
+        self.assertEqual(queries.search(self.collection).count(), 100)
+        self.assertEqual(
+            self.location.records.values("filename").distinct().count(), 100
+        )
+        self.assertTrue(
+            exists(join(self.get_dir("ingested"), self.index_file_name))
+        )
@@ -29,6 +29,7 @@
 import time
 import os
 import errno
+import shutil
 import fcntl
 from functools import wraps
 from datetime import timedelta, datetime
@@ -73,6 +74,24 @@ def safe_makedirs(path, mode=0770):
             raise
 
 
+def link_tree(src, dst):
+    """ Recreates the directory tree ``src`` at ``dst`` with hard links to
+    the files instead of copies, so no file data is copied. Changes to files
+    made in place are visible in both trees, files that are renamed or
+    removed are not. Falls back to copying when a file cannot be linked,
+    e.g. across file systems.
+    """
+    for dirpath, _, filenames in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(dirpath, src))
+        safe_makedirs(target)
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                os.link(path, os.path.join(target, filename))
+            except OSError:
+                shutil.copy2(path, os.path.join(target, filename))
+
+
 RE_ISO_8601_DURATION = re.compile(
     r"^(?P<sign>[+-])?P"
     r"(?:(?P<years>\d+(\.\d+)?)Y)?"